@@ -0,0 +1,163 @@
+"""
+Pools of interchangeable HTTP backends.
+
+Some lookups can be made against any of several public instances of the
+same service (Invidious for YouTube for instance), which come and go.
+BackendPool sends requests to the fastest instance that works, moving on
+to the next one when it fails.
+"""
+
+import threading
+import time
+
+import requests
+
+import deadline
+
+
+class Backend:
+    """
+    Backend is an instance of a service and how it has been doing.
+    """
+
+    def __init__(self, url):
+        """
+        __init__ is the constructor for the Backend class.
+
+        Args:
+            url (str): the base URL of the instance, without a trailing slash.
+        """
+        self.url = url
+        self.latency = None
+        self.failures = 0
+        self.down_until = 0.0
+
+
+class BackendPool:
+    """
+    BackendPool picks which instance of a service to send a request to.
+
+    Instances are tried by their average latency, an exponentially weighted
+    moving average of their response times, the ones not tried yet first.
+    An instance that fails is skipped for a cooldown that doubles with every
+    failure in a row, so a dead instance does not cost a connect timeout on
+    every request, and the request moves on to the next instance.
+    """
+
+    def __init__(
+        self, urls, alpha=0.3, cooldown=30, max_cooldown=15 * 60, connect_timeout=2
+    ):
+        """
+        __init__ is the constructor for the BackendPool class.
+
+        Args:
+            urls (list): the base URLs of the instances.
+            alpha (float): the weight of the last response time in the
+            average latency.
+            cooldown (float): seconds an instance is skipped after failing.
+            max_cooldown (float): the longest an instance is skipped.
+            connect_timeout (float): the connect timeout of the requests, an
+            instance that is up answers quickly.
+        """
+        self.backends = [Backend(url.rstrip("/")) for url in urls]
+        self.alpha = alpha
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.connect_timeout = connect_timeout
+        self.lock = threading.Lock()
+
+    def order(self):
+        """
+        order returns the instances in the order they are tried: the ones up
+        by latency, then the ones cooling down by when they come back, in
+        case they are all down.
+        """
+        now = time.monotonic()
+        with self.lock:
+            up = [backend for backend in self.backends if backend.down_until <= now]
+            down = [backend for backend in self.backends if backend.down_until > now]
+            up.sort(key=lambda backend: backend.latency or 0.0)
+            down.sort(key=lambda backend: backend.down_until)
+        return up + down
+
+    def succeeded(self, backend, seconds):
+        """
+        succeeded records that an instance answered in seconds.
+        """
+        with self.lock:
+            if backend.latency is None:
+                backend.latency = seconds
+            else:
+                backend.latency += self.alpha * (seconds - backend.latency)
+            backend.failures = 0
+            backend.down_until = 0.0
+
+    def failed(self, backend):
+        """
+        failed records that an instance did not answer, it is skipped until
+        its cooldown is over.
+        """
+        with self.lock:
+            cooldown = min(self.cooldown * 2**backend.failures, self.max_cooldown)
+            backend.failures += 1
+            backend.down_until = time.monotonic() + cooldown
+
+    def get(self, http, path, **kwargs):
+        """
+        get makes a GET request for path to the instances in turn until one
+        of them answers without a server error.
+
+        Args:
+            http (HTTPClient): the HTTP client to use.
+            path (str): the path of the request, starting with a slash.
+            **kwargs: passed on to HTTPClient.get.
+
+        Raises:
+            DeadlineExceeded if the deadline passed.
+            requests.exceptions.RequestException if no instance answered.
+
+        Returns:
+            requests.Response: the response of the first instance to answer.
+        """
+        error = requests.exceptions.ConnectionError("No backends configured.")
+        for backend in self.order():
+            connect, read = deadline.http_timeout(http.timeout)
+            timeout = (min(connect, self.connect_timeout), read)
+            start = time.monotonic()
+            try:
+                response = http.get(backend.url + path, timeout=timeout, **kwargs)
+                response.raise_for_status()
+            except requests.exceptions.HTTPError as e:
+                if e.response.status_code < 500:
+                    # The instance is up, the request is wrong.
+                    self.succeeded(backend, time.monotonic() - start)
+                    raise
+                error = e
+            except requests.exceptions.RequestException as e:
+                error = e
+            else:
+                self.succeeded(backend, time.monotonic() - start)
+                return response
+            print(f"{backend.url} failed: {error}")
+            self.failed(backend)
+        raise error
+
+    def report(self):
+        """
+        report returns how the instances have been doing.
+
+        Returns:
+            dict: by instance URL, its average latency in seconds (None if
+            not tried yet), its failures in a row and whether it is being
+            skipped
+        """
+        now = time.monotonic()
+        with self.lock:
+            return {
+                backend.url: {
+                    "latency": backend.latency,
+                    "failures": backend.failures,
+                    "down": backend.down_until > now,
+                }
+                for backend in self.backends
+            }
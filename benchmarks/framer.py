@@ -0,0 +1,116 @@
+"""
+Benchmark for ircproto.LineFramer.
+
+Replays an IRC capture (a file with one raw line per line, or a generated
+one when no file is given) through the framer and through the old
+byte-at-a-time recv() loop.
+
+Usage: python -m benchmarks.framer [capture] [--size MB]
+"""
+
+import argparse
+import random
+import time
+
+from ircproto import LineFramer
+
+
+class ReplaySocket:
+    """
+    ReplaySocket hands out a capture the way a TCP socket would, in packets
+    of random size.
+    """
+
+    def __init__(self, data, seed=0):
+        self.data = data
+        self.pos = 0
+        self.calls = 0
+        self.random = random.Random(seed)
+
+    def recv(self, size):
+        self.calls += 1
+        packet = min(size, self.random.randint(1, 1460))
+        chunk = self.data[self.pos : self.pos + packet]
+        self.pos += len(chunk)
+        return chunk
+
+
+def generate_capture(size):
+    """
+    generate_capture builds a capture resembling a netsplit followed by big
+    NAMES and WHO replies.
+    """
+    rnd = random.Random(1)
+    lines = []
+    total = 0
+    while total < size:
+        nick = "".join(
+            rnd.choice("abcdefghijklmnop") for _ in range(rnd.randint(3, 12))
+        )
+        kind = rnd.randint(0, 3)
+        if kind == 0:
+            line = f":{nick}!~{nick}@host-{rnd.randint(0, 9999)}.example.org QUIT :*.net *.split"
+        elif kind == 1:
+            names = " ".join(f"@{nick}{i}" for i in range(rnd.randint(10, 40)))
+            line = f":irc.example.org 353 botty = #channel :{names}"
+        elif kind == 2:
+            line = f":irc.example.org 352 botty #channel ~{nick} host.example.org irc.example.org {nick} H :0 {nick}"
+        else:
+            line = f":{nick}!~{nick}@host.example.org PRIVMSG #channel :hello there https://example.org/{nick}"
+        line = line.encode("utf-8") + b"\r\n"
+        lines.append(line)
+        total += len(line)
+    return b"".join(lines)
+
+
+def legacy(sock):
+    """
+    legacy is the framing IRCClient.recv used to do.
+    """
+    lines = 0
+    while sock.pos < len(sock.data):
+        data = sock.recv(1024)
+        while not data.endswith(b"\r\n"):
+            data += sock.recv(1)
+        lines += len(data.rstrip(b"\r\n").split(b"\r\n"))
+    return lines
+
+
+def framed(sock):
+    """
+    framed is the framing done with LineFramer.
+    """
+    framer = LineFramer()
+    lines = 0
+    while sock.pos < len(sock.data):
+        lines += len(framer.feed(sock.recv(65536)))
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("capture", nargs="?", help="raw IRC capture to replay")
+    parser.add_argument(
+        "--size", type=float, default=8, help="size in MB of the generated capture"
+    )
+    args = parser.parse_args()
+
+    if args.capture:
+        with open(args.capture, "rb") as capture:
+            data = capture.read().replace(b"\r\n", b"\n").replace(b"\n", b"\r\n")
+    else:
+        data = generate_capture(int(args.size * 1024 * 1024))
+    print(f"capture: {len(data) / 1024 / 1024:.1f} MB")
+
+    for name, function in (("legacy recv(1)", legacy), ("LineFramer", framed)):
+        sock = ReplaySocket(data)
+        start = time.perf_counter()
+        lines = function(sock)
+        elapsed = time.perf_counter() - start
+        print(
+            f"{name:>15}: {elapsed:.3f}s, {lines / elapsed:,.0f} lines/s, {sock.calls:,} recv() calls"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Microbenchmark for ircproto.IRCMessage.
+
+Compares parsing lines with IRCMessage against the string splitting the
+decider and privmsg_handler used to do.
+
+Usage: python -m benchmarks.parse [--size MB]
+"""
+
+import argparse
+import time
+
+from benchmarks.framer import generate_capture
+from ircproto import IRCMessage
+
+
+def legacy(lines):
+    """
+    legacy splits the lines the way botty used to.
+    """
+    for msg in lines:
+        if msg.startswith("PING"):
+            continue
+        if msg.split(" ")[1] == "PRIVMSG":
+            nick = msg.split("!", 1)[0][1:]
+            source = msg.split("PRIVMSG", 1)[1].split(":", 1)[0].split(" ")[1]
+            privmsg = msg.split("PRIVMSG", 1)[1].split(":", 1)[1]
+            netmask = "@".join(msg.split("@")[0:2]).split(" ", maxsplit=1)[0]
+
+
+def parsed(lines):
+    """
+    parsed parses the lines with IRCMessage.
+    """
+    for line in lines:
+        msg = IRCMessage(line)
+        if msg.command == "PRIVMSG":
+            nick = msg.nick
+            source = msg.params[0]
+            privmsg = msg.params[1]
+            netmask = msg.prefix
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--size", type=float, default=4, help="size in MB of the generated lines"
+    )
+    args = parser.parse_args()
+
+    lines = (
+        generate_capture(int(args.size * 1024 * 1024))
+        .decode("utf-8")
+        .split("\r\n")[:-1]
+    )
+    privmsgs = [line for line in lines if " PRIVMSG " in line]
+    tagged = [
+        f"@time=2022-10-29T13:19:00.000Z;msgid=abc\\sdef {line}" for line in lines
+    ]
+    for corpus, data in (("all lines", lines), ("PRIVMSG only", privmsgs)):
+        print(f"{corpus}:")
+        for name, function in (("legacy", legacy), ("IRCMessage", parsed)):
+            start = time.perf_counter()
+            function(data)
+            elapsed = time.perf_counter() - start
+            print(f"{name:>15}: {len(data) / elapsed:,.0f} lines/s")
+
+    start = time.perf_counter()
+    parsed(tagged)
+    elapsed = time.perf_counter() - start
+    print("all lines with IRCv3 tags:")
+    print(f"{'IRCMessage':>15}: {len(tagged) / elapsed:,.0f} lines/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Benchmark for common.split_text_by_bytes.
+
+Splits 100 KB of mixed ASCII and multibyte text with the current splitter
+and with the character-by-character one it replaced.
+
+Usage: python -m benchmarks.split [--size KB] [--max-length BYTES]
+"""
+
+import argparse
+import random
+import time
+
+from common import split_text_by_bytes
+
+
+def legacy_split_text_by_bytes(text, max_length):
+    """
+    legacy_split_text_by_bytes is the splitter botty used to have, kept
+    here to compare against.
+    """
+    data = text
+    new_data = ""
+    for character in data:
+        new_data += character
+        if len(new_data.encode("utf-8")) > max_length:
+            new_new_data = new_data
+            new_data = ""
+            while len(new_new_data.encode("utf-8")) > max_length:
+                new_data += new_new_data[-1]
+                new_new_data = new_new_data[:-1]
+
+            # Attempt to split at complete word.
+            if new_new_data.find(" ") != -1:
+                while new_new_data[-1] != " ":
+                    new_data = new_new_data[-1] + new_data
+                    new_new_data = new_new_data[:-1]
+
+            yield new_new_data
+            del new_new_data
+
+    if len(new_data) > 0:
+        yield new_data
+
+
+def generate_text(size):
+    """
+    generate_text builds roughly size bytes of words in several scripts.
+    """
+    rnd = random.Random(1)
+    words = [
+        "hello",
+        "world",
+        "botty",
+        "здравствуй",
+        "мир",
+        "こんにちは",
+        "世界",
+        "😀",
+        "çà",
+        "ünïcödé",
+    ]
+    text = []
+    total = 0
+    while total < size:
+        word = rnd.choice(words)
+        text.append(word)
+        total += len(word.encode("utf-8")) + 1
+    return " ".join(text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=int, default=100, help="size of the text in KB")
+    parser.add_argument(
+        "--max-length", type=int, default=400, help="maximum bytes per line"
+    )
+    args = parser.parse_args()
+
+    text = generate_text(args.size * 1024)
+    for name, function in (
+        ("legacy", legacy_split_text_by_bytes),
+        ("split_text_by_bytes", split_text_by_bytes),
+    ):
+        start = time.perf_counter()
+        lines = list(function(text, args.max_length))
+        elapsed = time.perf_counter() - start
+        print(f"{name:>19}: {elapsed * 1000:.1f}ms, {len(lines)} lines")
+
+
+if __name__ == "__main__":
+    main()
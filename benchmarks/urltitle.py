@@ -0,0 +1,104 @@
+"""
+Benchmark for the fetch path of modules.urltitle.
+
+Serves a page behind a redirect from a local server that waits --latency
+milliseconds before every response, and measures the time to get its
+title with the single streaming GET UrlTitle does and with the HEAD then
+GET it used to do.
+
+Usage: python -m benchmarks.urltitle [--runs N] [--latency MS]
+"""
+
+import argparse
+import http.server
+import statistics
+import threading
+import time
+
+from cache import TTLCache
+from httpclient import HTTPClient
+from modules.urltitle import UrlTitle
+
+# Kept small so the round trips, not the parsing, are measured.
+PAGE = b"<html><head><title>Benchmark page</title></head><body></body></html>"
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    """
+    Handler answers /short with a redirect to /page, after a delay.
+    """
+
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+
+    def reply(self, body):
+        time.sleep(self.latency)
+        if self.path.startswith("/short"):
+            self.send_response(302)
+            self.send_header("Location", "/page" + self.path[len("/short") :])
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(PAGE)))
+        self.end_headers()
+        if body:
+            self.wfile.write(PAGE)
+
+    def do_GET(self):
+        self.reply(True)
+
+    def do_HEAD(self):
+        self.reply(False)
+
+    def log_message(self, *args):
+        pass
+
+
+def legacy_title(urltitle, url):
+    """
+    legacy_title resolves the URL with a HEAD request and then fetches it
+    with a GET, the way UrlTitle used to.
+    """
+    response = urltitle.http.head(url, allow_redirects=True, headers=urltitle.headers)
+    response = urltitle.http.get(
+        response.url, allow_redirects=True, stream=True, headers=urltitle.headers
+    )
+    return urltitle.fetch_title(response)[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=50, help="titles per fetch path")
+    parser.add_argument(
+        "--latency", type=float, default=50, help="server latency in milliseconds"
+    )
+    args = parser.parse_args()
+
+    Handler.latency = args.latency / 1000
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    # Nothing is cached, every run uses a different URL.
+    urltitle = UrlTitle(HTTPClient(), cache=TTLCache(max_entries=0))
+    for name, function in (
+        ("HEAD then GET", legacy_title),
+        ("single GET", lambda urltitle, url: urltitle.title(url)),
+    ):
+        times = []
+        for run in range(args.runs):
+            start = time.perf_counter()
+            messages = function(urltitle, f"{base}/short?{name[0]}{run}")
+            times.append(time.perf_counter() - start)
+            assert messages, "no title"
+        print(
+            f"{name:>13}: median {statistics.median(times) * 1000:.1f}ms, "
+            f"p90 {statistics.quantiles(times, n=10)[-1] * 1000:.1f}ms"
+        )
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Benchmark for webpreview.web_preview.
+
+Runs every page of the fixture corpus (webpreview/fixtures/corpus) through
+web_preview, which parses a page once, with its BeautifulSoup and lxml
+backends, and through the previous implementation, which built one
+BeautifulSoup tree per extractor. The pages are given undecoded, as read
+from the network.
+
+For every page and implementation it reports the time per page, the
+throughput, the peak memory and the memory still allocated afterwards
+(measured with tracemalloc, in a separate run, so the trees libxml2
+allocates itself are not counted), and whether the preview matches
+webpreview/fixtures/corpus/expected.json.
+
+Usage: python -m benchmarks.webpreview [--runs N] [--parser PARSER] [pages...]
+"""
+
+import argparse
+import functools
+import gc
+import json
+import pathlib
+import time
+import tracemalloc
+
+from webpreview import GenericPreview, OpenGraph, Schema, TwitterCard, web_preview
+from webpreview.helpers import process_image_url
+
+CORPUS = pathlib.Path(__file__).parent.parent / "webpreview" / "fixtures" / "corpus"
+URL = "https://example.com/article"
+
+
+def legacy_web_preview(url, content=None, parser=None):
+    """
+    legacy_web_preview is the web_preview botty used to have, kept here to
+    compare against.
+    """
+    og = OpenGraph(
+        url, ["og:title", "og:description", "og:image"], content=content, parser=parser
+    )
+    if og.title:
+        return og.title, og.description, process_image_url(url, og.image, False)
+    tc = TwitterCard(
+        url,
+        ["twitter:title", "twitter:description", "twitter:image"],
+        content=content,
+        parser=parser,
+    )
+    if tc.title:
+        return tc.title, tc.description, process_image_url(url, tc.image, False)
+    s = Schema(url, ["name", "description", "image"], content=content, parser=parser)
+    if s.name:
+        return s.name, s.description, process_image_url(url, s.image, False)
+    gp = GenericPreview(url, content=content, parser=parser)
+    return gp.title, gp.description, process_image_url(url, gp.image, False)
+
+
+def load_corpus():
+    """
+    load_corpus returns the pages of the corpus by name and their expected
+    previews.
+    """
+    pages = {path.name: path.read_bytes() for path in sorted(CORPUS.glob("*.html"))}
+    expected = json.loads((CORPUS / "expected.json").read_text(encoding="utf-8"))
+    return pages, expected
+
+
+def measure_memory(function, content, parser):
+    """
+    measure_memory returns the peak memory used by a call and the memory
+    still allocated after it, in bytes.
+    """
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = function(URL, content=content, parser=parser)
+        current, peak = tracemalloc.get_traced_memory()
+        del result
+        # BeautifulSoup trees are reference cycles.
+        gc.collect()
+        retained = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    return peak - before, retained
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=20, help="runs per page")
+    parser.add_argument("--parser", default="lxml", help="BeautifulSoup parser")
+    parser.add_argument("pages", nargs="*", help="pages of the corpus to run")
+    args = parser.parse_args()
+
+    pages, expected = load_corpus()
+    if args.pages:
+        pages = {name: pages[name] for name in args.pages}
+    implementations = (
+        ("legacy", legacy_web_preview),
+        ("soup", web_preview),
+        ("lxml", functools.partial(web_preview, backend="lxml")),
+    )
+    totals = {label: 0.0 for label, _ in implementations}
+    failures = 0
+    print(
+        f"{'page':>24} {'impl':>6} {'ms/page':>8} {'MB/s':>7} "
+        f"{'peak KB':>8} {'kept KB':>8}  result"
+    )
+    for name, content in pages.items():
+        want = expected[name]
+        want = (want["title"], want["description"], want["image"])
+        for label, function in implementations:
+            start = time.perf_counter()
+            for _ in range(args.runs):
+                result = function(URL, content=content, parser=args.parser)
+            elapsed = (time.perf_counter() - start) / args.runs
+            totals[label] += elapsed
+            peak, retained = measure_memory(function, content, args.parser)
+            ok = tuple(result) == want
+            failures += not ok
+            print(
+                f"{name:>24} {label:>6} {elapsed * 1000:8.2f} "
+                f"{len(content) / elapsed / 1e6:7.1f} {peak / 1024:8.0f} "
+                f"{retained / 1024:8.1f}  {'ok' if ok else 'MISMATCH ' + repr(result)}"
+            )
+    size = sum(len(content) for content in pages.values())
+    for label, elapsed in totals.items():
+        print(
+            f"{'corpus':>24} {label:>6} {elapsed * 1000:8.2f} "
+            f"{size / elapsed / 1e6:7.1f}"
+        )
+    if failures:
+        raise SystemExit(f"{failures} previews do not match expected.json")
+
+
+if __name__ == "__main__":
+    main()
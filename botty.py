@@ -4,61 +4,32 @@
 Basic IRC bot.
 """
 
+import asyncio
+import functools
 import socket
 import threading
-import time
 
-from config import (CHANNELS_TO_JOIN, MODULES, MODULES_BACKGROUND,
-                    NICKSERV_PASS, SERVER_ADDR, SERVER_NICK, SERVER_PASS,
-                    SERVER_PORT)
-
-
-def split_text_by_bytes(text, max_length):
-    """
-    split_text_by_bytes is a helper function that splits a utf-8 string
-    into multiple strings of a maximum byte length.
-
-    Args:
-        text (str or bytes): The string to split.
-        max_length (int): The maximum length of each string.
-
-    Yields:
-        The split string.
-    """
-    if isinstance(text, str):
-        data = text
-    elif isinstance(text, bytes):
-        data = text.decode("utf-8")
-    else:
-        raise TypeError("text must be a string or bytes")
-    del text
-
-    new_data = ""
-    for character in data:
-        new_data += character
-        if len(new_data.encode("utf-8")) > max_length:
-            new_new_data = new_data
-            new_data = ""
-            while len(new_new_data.encode("utf-8")) > max_length:
-                new_data += new_new_data[-1]
-                new_new_data = new_new_data[:-1]
-
-            # Attempt to split at complete word.
-            if new_new_data.find(" ") != -1:
-                while new_new_data[-1] != " ":
-                    new_data = new_new_data[-1] + new_data
-                    new_new_data = new_new_data[:-1]
-
-            yield new_new_data
-            del new_new_data
-
-    if len(new_data) > 0:
-        yield new_data
+from common import split_text_by_bytes
+from config import (CHANNELS_TO_JOIN, FLOOD_BURST, FLOOD_RATE, MAX_PENDING,
+                    MESSAGE_TIMEOUT, MODULE_TIMEOUT, MODULE_TIMEOUTS,
+                    MODULE_WORKERS, MODULES, MODULES_BACKGROUND, NICKSERV_PASS,
+                    OVERLOAD_POLICY, SERVER_ADDR, SERVER_NICK, SERVER_PASS,
+                    SERVER_PORT, SOURCE_QUEUE_SIZE)
+from context import MessageContext
+from dispatch import Dispatcher
+from ircproto import IRCMessage, LineFramer
+from outbound import BULK, INTERACTIVE, PROTOCOL, OutboundQueue
+from workers import WorkerPool
 
 
 class IRCClient:
     """
     IRCClient class is a simple IRC client.
+
+    A single asyncio event loop owns the connection. The (synchronous) modules
+    are run on a bounded pool of worker threads, so the number of threads does
+    not grow with the amount of messages received. Messages from the same
+    channel or nick are handled in the order they were received.
     """
 
     def __init__(
@@ -69,6 +40,7 @@ class IRCClient:
         _server_nick,
         _channels_to_join,
         _nickserv_pass,
+        _module_workers=MODULE_WORKERS,
     ):
         """
         __init__ is the constructor for the IRCClient class.
@@ -80,6 +52,7 @@ class IRCClient:
             _server_nick: The nickname to use when connecting to the IRC server.
             _channels_to_join: A list of channels to join when connecting to the IRC server.
             _nickserv_pass: The password to use when connecting to the NickServ service.
+            _module_workers: The amount of threads used to run the modules.
 
         Returns:
             None
@@ -94,11 +67,50 @@ class IRCClient:
         self.server_nick = _server_nick
         self.channels_to_join = _channels_to_join
         self.nickserv_pass = _nickserv_pass
-        self.sock = socket.socket(socket.AF_INET6, socket.SOCK_STREAM)
-        self.sock.connect((self.server_addr, self.server_port))
-        self.initialize()
+        self.module_workers = _module_workers
+        self.loop = None
+        self.reader = None
+        self.writer = None
+        self.outbound = None
+        self.framer = LineFramer()
+        self.dispatcher = Dispatcher(MODULES, MODULE_TIMEOUT, MODULE_TIMEOUTS)
+        self.workers = None
+        asyncio.run(self.run())
+
+    async def run(self):
+        """
+        run connects to the IRC server and processes messages until the
+        connection is closed.
 
-    def initialize(self):
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        self.loop = asyncio.get_running_loop()
+        self.workers = WorkerPool(
+            self.module_workers,
+            SOURCE_QUEUE_SIZE,
+            MAX_PENDING,
+            OVERLOAD_POLICY,
+            MESSAGE_TIMEOUT,
+        )
+        self.reader, self.writer = await asyncio.open_connection(
+            self.server_addr, self.server_port, family=socket.AF_INET6
+        )
+        self.outbound = OutboundQueue(self.writer, FLOOD_RATE, FLOOD_BURST)
+        writer = asyncio.create_task(self.outbound.run())
+        try:
+            decider = asyncio.create_task(self.decider())
+            await self.initialize()
+            await decider
+        finally:
+            writer.cancel()
+            self.writer.close()
+            self.workers.shutdown()
+
+    async def initialize(self):
         """
         initialize initializes the IRC connection by setting up the nickname,
         username, and password. It also joins the channels specified in the
@@ -111,126 +123,131 @@ class IRCClient:
             None
         """
         self.send(f"PASS {self.server_pass}")
-        self.decider(run_once=True)
         self.send(f"NICK {self.server_nick}")
-        self.decider(run_once=True)
         self.send(
             f"USER {self.server_nick} {self.server_nick} {self.server_nick} :{self.server_nick}"
         )
-        self.decider(run_once=True)
         if self.nickserv_pass is not None:
-            self.send(f"PRIVMSG NickServ :IDENTIFY {self.nickserv_pass}\r\n")
-            self.decider(run_once=True)
-        time.sleep(1)
+            self.send(f"PRIVMSG NickServ :IDENTIFY {self.nickserv_pass}")
+        await asyncio.sleep(1)
         for channel in self.channels_to_join:
             self.send(f"JOIN {channel}")
-            self.decider(run_once=True)
         for module in MODULES_BACKGROUND:
-            threading.Thread(target=module, args=(self.send_message,)).start()
-        self.decider()
-
-    def send(self, msg):
+            # Background modules run for the lifetime of the bot, so they get
+            # their own thread instead of occupying a module worker.
+            threading.Thread(
+                target=module,
+                args=(functools.partial(self.send_message, lane=BULK),),
+                daemon=True,
+            ).start()
+
+    def send(self, msg, lane=PROTOCOL, target=None):
         """
-        send is a helper function that sends a message to the IRC server.
+        send is a helper function that queues a message to be sent to the
+        IRC server. It is safe to call from the module threads.
 
         Args:
             msg: The message to send to the IRC server.
+            lane: The outbound lane to send the message in.
+            target: The channel or nick the message is for, if any.
 
         Returns:
             None
         """
         print(f"> {msg}")
-        self.sock.send(f"{msg}".encode("utf-8") + b"\r\n")
-
-    def recv(self):
+        data = f"{msg}".encode("utf-8") + b"\r\n"
+        if self.loop is None or self.loop.is_closed():
+            return
+        try:
+            on_loop = asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            self.outbound.put(data, lane, target)
+        else:
+            self.loop.call_soon_threadsafe(self.outbound.put, data, lane, target)
+
+    async def recv(self):
         """
-        recv is a helper function that receives a message from the IRC server.
+        recv is a helper function that receives messages from the IRC server.
 
         Args:
             None
 
         Returns:
-            data - The message received from the IRC server.
+            lines - The complete messages received from the IRC server, an
+            empty list if none is complete yet.
+
+        Raises:
+            ConnectionError if the server closed the connection.
         """
-        data = self.sock.recv(1024)
-        # Keep receiving data until we get a complete message
-        while not data.endswith(b"\r\n"):
-            data += self.sock.recv(1)
-        # Return the message
-        return data
+        data = await self.reader.read(65536)
+        if not data:
+            raise ConnectionError("Connection closed by the server.")
+        return self.framer.feed(data)
 
     def ctcp_handler(self, msg, nick, source, privmsg, netmask, is_channel):
         """
         ctcp_handler is a helper function that handles CTCP messages.
 
         Args:
-            msg: The message received from the IRC server.
+            msg: The IRCMessage received from the IRC server.
             nick: The nickname of the user who sent the message.
             source: The source of the message.
             privmsg: The message itself.
-            netmask: The netmask of the user who sent the message.
+            netmask: The netmask of the user who sent the message, starting
+            with a colon.
             is_channel: Whether or not the message was sent in a channel.
 
         Returns:
             None
         """
-        raise SystemExit(0)
+        return None
 
-    def privmsg_handler(self, msg):
+    def privmsg_handler(self, ctx):
         """
         privmsg_handler is a helper function that handles a PRIVMSG message.
+        It runs on one of the module worker threads.
 
         Args:
-            msg: The message received from the IRC server.
+            ctx: The MessageContext of the message.
 
         Returns:
             None
         """
-        nick = msg.split("!", 1)[0][1:]
-        source = msg.split("PRIVMSG", 1)[1].split(":", 1)[0].split(" ")[1]
-        privmsg = msg.split("PRIVMSG", 1)[1].split(":", 1)[1]
-        netmask = "@".join(msg.split("@")[0:2]).split(" ", maxsplit=1)[0]
-        is_channel = True
-        # If the message was not received from the channel,
-        # we set the source to the nick so the rest of the code
-        # is not broken by the fact that the source is not a channel
-        if not source.startswith("#"):
-            source = nick
-            is_channel = False
-        print("Received PRIVMSG:", nick, source, privmsg, netmask, is_channel)
+        msg = ctx.msg
+        print(
+            "Received PRIVMSG:",
+            ctx.nick,
+            ctx.source,
+            ctx.privmsg,
+            ctx.netmask,
+            ctx.is_channel,
+        )
 
         # Handle CTCP requests in a separate function
-        if privmsg.startswith("\x01"):
-            self.ctcp_handler(msg, nick, source, privmsg, netmask, is_channel)
+        if ctx.privmsg.startswith("\x01"):
+            self.ctcp_handler(
+                msg,
+                ctx.nick,
+                ctx.source,
+                ctx.privmsg,
+                ctx.legacy_netmask,
+                ctx.is_channel,
+            )
+            return
 
         # Run the functions
-        try:
-            for module in MODULES:
-                try:
-                    if (
-                        module(
-                            nick,
-                            source,
-                            privmsg,
-                            netmask,
-                            is_channel,
-                            self.send_message,
-                        )
-                        == True
-                    ):
-                        break
-                except Exception as e:
-                    print(f"Error: {e}")
-        finally:
-            raise SystemExit(0)
+        self.dispatcher.dispatch(ctx, self.send_message)
 
-    def send_message(self, msg, target):
+    def send_message(self, msg, target, lane=INTERACTIVE):
         """
         send_message is a helper function that sends a message to a target.
 
         Args:
             msg: The message to send to the target.
             target: The target to send the message to.
+            lane: The outbound lane, BULK for output nobody is waiting for.
 
         Returns:
             None
@@ -252,9 +269,9 @@ class IRCClient:
 
         for line in msg.splitlines():
             for split_line in split_text_by_bytes(line, max_length=max_msg_length):
-                self.send(f"PRIVMSG {target} :{split_line}")
+                self.send(f"PRIVMSG {target} :{split_line}", lane, target)
 
-    def decider(self, run_once=False):
+    async def decider(self):
         """
         decider is a helper function that decides what to do with the message
         received from the IRC server.
@@ -266,19 +283,29 @@ class IRCClient:
             None
         """
         while True:
-            ircmsgs = self.recv().decode("utf-8")
-            ircmsgs = ircmsgs.rstrip("\r\n").split("\r\n")
-            for ircmsg in ircmsgs:
-                print(f"< {ircmsg}")
-                if ircmsg.startswith("PING"):
-                    self.send(ircmsg.replace("PING", "PONG"))
-                elif ircmsg.split(" ")[1] == "PRIVMSG":
-                    threading.Thread(
-                        target=self.privmsg_handler, args=(ircmsg,)
-                    ).start()
-
-            if run_once:
+            try:
+                ircmsgs = await self.recv()
+            except ConnectionError as e:
+                print(e)
                 break
+            for line in ircmsgs:
+                line = line.decode("utf-8", errors="replace")
+                print(f"< {line}")
+                try:
+                    ircmsg = IRCMessage(line)
+                except ValueError as e:
+                    print(f"Error: {e}")
+                    continue
+                if ircmsg.command == "PING":
+                    pong = f"PONG :{ircmsg.params[-1]}" if ircmsg.params else "PONG"
+                    self.send(pong)
+                elif (
+                    ircmsg.command == "PRIVMSG"
+                    and len(ircmsg.params) >= 2
+                    and ircmsg.nick is not None
+                ):
+                    ctx = MessageContext(ircmsg)
+                    await self.workers.submit(ctx.source, self.privmsg_handler, ctx)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,505 @@
+"""
+Caches for botty modules.
+
+TTLCache is an in-process cache. PersistentCache keeps entries in an SQLite
+database as well, so they survive restarts, and hands out namespaces that
+are used like a TTLCache.
+"""
+
+import atexit
+import collections
+import json
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+
+
+def sizeof(value):
+    """
+    sizeof estimates the memory used by a cached value.
+
+    Args:
+        value: a string, bytes, number, None or a list/tuple/dict of those.
+
+    Returns:
+        int: the estimated size in bytes.
+    """
+    size = sys.getsizeof(value)
+    if isinstance(value, (list, tuple)):
+        size += sum(sizeof(item) for item in value)
+    elif isinstance(value, dict):
+        size += sum(sizeof(key) + sizeof(item) for key, item in value.items())
+    return size
+
+
+class TTLCache:
+    """
+    TTLCache is a thread-safe LRU cache whose entries expire. It is bounded
+    both by the amount of entries and by their estimated size, the least
+    recently used entries are evicted first.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=1024 * 1024):
+        """
+        __init__ is the constructor for the TTLCache class.
+
+        Args:
+            max_entries (int): the maximum amount of entries.
+            max_bytes (int): the maximum estimated size of all entries.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        """
+        get returns the cached value of a key.
+
+        Args:
+            key: the key.
+            default: returned if the key is not cached or has expired.
+
+        Returns:
+            the value, or default.
+        """
+        with self.lock:
+            try:
+                value, expires, size = self.entries[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            if expires <= time.monotonic():
+                del self.entries[key]
+                self.bytes -= size
+                self.misses += 1
+                return default
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl):
+        """
+        set caches a value.
+
+        Args:
+            key: the key.
+            value: the value.
+            ttl (float): the seconds the value stays valid.
+
+        Returns:
+            None
+        """
+        size = sizeof(key) + sizeof(value)
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old[2]
+            self.entries[key] = (value, time.monotonic() + ttl, size)
+            self.bytes += size
+            while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+                _, (_, _, evicted) = self.entries.popitem(last=False)
+                self.bytes -= evicted
+                self.evictions += 1
+
+    def report(self):
+        """
+        report returns the statistics of the cache.
+
+        Returns:
+            dict: the amount of entries, their estimated size, the hits,
+            misses, hit ratio and evictions.
+        """
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+
+class PersistentCache:
+    """
+    PersistentCache is a cache kept in an SQLite database, shared by the
+    modules through namespaces (see namespace).
+
+    Entries are read from an in-memory TTLCache per namespace first, the
+    database is only read on a miss, by the calling thread. Writes are
+    queued and made by a background thread, in batches, so modules never
+    wait on the disk to cache something. When the entries on disk grow
+    past max_bytes, the expired ones then the least recently used ones are
+    evicted.
+
+    Keys and values are stored as JSON, so they must be strings, numbers,
+    None or lists/dicts of those, and tuples come back as lists.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS entries (
+            namespace TEXT NOT NULL,
+            key TEXT NOT NULL,
+            value TEXT NOT NULL,
+            expires REAL NOT NULL,
+            size INTEGER NOT NULL,
+            used REAL NOT NULL,
+            hits INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (namespace, key)
+        );
+        CREATE INDEX IF NOT EXISTS entries_used ON entries (used);
+    """
+
+    def __init__(
+        self,
+        directory,
+        max_bytes=64 * 1024 * 1024,
+        max_pending=4096,
+        touch_interval=5 * 60,
+    ):
+        """
+        __init__ is the constructor for the PersistentCache class.
+
+        Args:
+            directory (str): the directory of the database, created if
+            needed.
+            max_bytes (int): the maximum size of the entries on disk.
+            max_pending (int): the maximum amount of writes waiting for the
+            background thread, writes beyond that are dropped.
+            touch_interval (float): seconds during which the uses of an
+            entry after the first are not written to disk, the last use and
+            the use count of entries (which decide what is evicted and
+            preloaded) are only that precise.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, "cache.sqlite3")
+        self.max_bytes = max_bytes
+        self.touch_interval = touch_interval
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        # Readers are not blocked by the background thread writing.
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(self.SCHEMA)
+        self.writes = queue.Queue(max_pending)
+        self.dropped = 0
+        self.evictions = 0
+        # Size of the entries on disk, kept by the background thread.
+        self.disk_bytes = 0
+        self.writer = threading.Thread(
+            target=self.write, name="persistent-cache", daemon=True
+        )
+        self.writer.start()
+        atexit.register(self.close)
+
+    def namespace(self, name, max_entries=1024, max_bytes=1024 * 1024, preload=0):
+        """
+        namespace returns the part of the cache used by a module, used like
+        a TTLCache.
+
+        Args:
+            name (str): the name of the namespace.
+            max_entries (int): the maximum amount of entries kept in memory.
+            max_bytes (int): the maximum estimated size of the entries kept
+            in memory.
+            preload (int): the amount of entries loaded into memory when
+            starting, the most used ones first.
+
+        Returns:
+            CacheNamespace: the namespace.
+        """
+        namespace = CacheNamespace(self, name, TTLCache(max_entries, max_bytes))
+        if preload:
+            self.put(("preload", namespace, preload))
+        return namespace
+
+    def read(self, name, key):
+        """
+        read reads an entry from the database.
+
+        Returns:
+            tuple: the value and the time.time() it expires at, None if the
+            entry is not in the database or has expired.
+        """
+        with self.lock:
+            row = self.db.execute(
+                "SELECT value, expires FROM entries WHERE namespace = ? AND key = ?",
+                (name, key),
+            ).fetchone()
+        if row is None or row[1] <= time.time():
+            return None
+        return json.loads(row[0]), row[1]
+
+    def put(self, write):
+        """
+        put queues a write for the background thread, dropping it if too
+        many are waiting.
+        """
+        try:
+            self.writes.put_nowait(write)
+        except queue.Full:
+            with self.lock:
+                self.dropped += 1
+
+    def write(self):
+        """
+        write makes the queued writes, it runs in the background thread.
+        """
+        db = sqlite3.connect(self.path)
+        (self.disk_bytes,) = db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()
+        while True:
+            batch = [self.writes.get()]
+            while True:
+                try:
+                    batch.append(self.writes.get_nowait())
+                except queue.Empty:
+                    break
+            size = self.disk_bytes
+            try:
+                with db:
+                    for write in batch:
+                        if write is None:
+                            continue
+                        if write[0] == "preload":
+                            self.preload(db, write[1], write[2])
+                        elif write[0] == "set":
+                            old = db.execute(
+                                "SELECT size FROM entries "
+                                "WHERE namespace = ? AND key = ?",
+                                write[1:3],
+                            ).fetchone()
+                            db.execute(
+                                "INSERT OR REPLACE INTO entries "
+                                "(namespace, key, value, expires, size, used) "
+                                "VALUES (?, ?, ?, ?, ?, ?)",
+                                write[1:],
+                            )
+                            size += write[5] - (old[0] if old else 0)
+                        elif write[0] == "touch":
+                            db.execute(
+                                "UPDATE entries SET used = ?, hits = hits + 1 "
+                                "WHERE namespace = ? AND key = ?",
+                                write[1:],
+                            )
+                    if size > self.max_bytes:
+                        size = self.evict(db, size)
+                self.disk_bytes = size
+            except sqlite3.Error as e:
+                print(f"Could not write to the persistent cache: {e}")
+                # The batch was rolled back.
+                (self.disk_bytes,) = db.execute(
+                    "SELECT COALESCE(SUM(size), 0) FROM entries"
+                ).fetchone()
+            if None in batch:
+                db.close()
+                return
+
+    def preload(self, db, namespace, amount):
+        """
+        preload loads the most used entries of a namespace into memory.
+        """
+        now = time.time()
+        rows = db.execute(
+            "SELECT key, value, expires FROM entries "
+            "WHERE namespace = ? AND expires > ? "
+            "ORDER BY hits DESC, used DESC LIMIT ?",
+            (namespace.name, now, amount),
+        ).fetchall()
+        for key, value, expires in reversed(rows):
+            namespace.memory.set(
+                namespace.key(json.loads(key)), json.loads(value), expires - now
+            )
+        print(f"Preloaded {len(rows)} entries of {namespace.name}")
+
+    def evict(self, db, size):
+        """
+        evict deletes the expired entries, then the least recently used
+        ones, until the entries on disk take 90% of max_bytes.
+
+        Args:
+            db (sqlite3.Connection): the connection of the background thread.
+            size (int): the size of the entries on disk.
+
+        Returns:
+            int: the size of the entries left.
+        """
+        now = time.time()
+        (expired_size,) = db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM entries WHERE expires <= ?", (now,)
+        ).fetchone()
+        evicted = db.execute("DELETE FROM entries WHERE expires <= ?", (now,)).rowcount
+        size -= expired_size
+        for row_id, row_size in db.execute(
+            "SELECT rowid, size FROM entries ORDER BY used"
+        ).fetchall():
+            if size <= self.max_bytes * 0.9:
+                break
+            db.execute("DELETE FROM entries WHERE rowid = ?", (row_id,))
+            size -= row_size
+            evicted += 1
+        with self.lock:
+            self.evictions += evicted
+        return size
+
+    def close(self):
+        """
+        close makes the writes still queued and closes the database.
+        """
+        if not self.writer.is_alive():
+            return
+        self.writes.put(None)
+        self.writer.join()
+        with self.lock:
+            self.db.close()
+
+    def report(self):
+        """
+        report returns the statistics of the database.
+
+        Returns:
+            dict: the writes waiting, the writes dropped, the size of the
+            entries on disk and the entries evicted from disk.
+        """
+        with self.lock:
+            return {
+                "pending": self.writes.qsize(),
+                "disk_bytes": self.disk_bytes,
+                "dropped": self.dropped,
+                "evictions": self.evictions,
+            }
+
+
+class CacheNamespace:
+    """
+    CacheNamespace is the part of a PersistentCache used by a module. It
+    has the methods of a TTLCache, so modules taking a TTLCache can be given
+    a namespace instead.
+    """
+
+    def __init__(self, store, name, memory):
+        """
+        __init__ is the constructor for the CacheNamespace class.
+
+        Args:
+            store (PersistentCache): the cache the namespace is part of.
+            name (str): the name of the namespace.
+            memory (TTLCache): the entries kept in memory.
+        """
+        self.store = store
+        self.name = name
+        self.memory = memory
+        self.lock = threading.Lock()
+        self.disk_hits = 0
+        self.disk_misses = 0
+        # When the entries were last written as used, as many as in memory.
+        self.touched = collections.OrderedDict()
+
+    def touch(self, encoded, now, written=False):
+        """
+        touch writes that an entry was used, unless it was less than
+        touch_interval ago.
+
+        Args:
+            encoded (str): the key, as stored in the database.
+            now (float): the time.time() the entry was used.
+            written (bool): whether the use is already being written, by a
+            set.
+        """
+        with self.lock:
+            last = self.touched.get(encoded)
+            if not written and last is not None:
+                if now - last < self.store.touch_interval:
+                    return
+            self.touched[encoded] = now
+            self.touched.move_to_end(encoded)
+            if len(self.touched) > self.memory.max_entries:
+                self.touched.popitem(last=False)
+        if not written:
+            self.store.put(("touch", now, self.name, encoded))
+
+    @staticmethod
+    def key(key):
+        """
+        key returns the key an entry is kept under in memory, keys read back
+        from the database have lists where the caller used tuples.
+        """
+        return tuple(map(CacheNamespace.key, key)) if isinstance(key, list) else key
+
+    def get(self, key, default=None):
+        """
+        get returns the cached value of a key, from memory or else from the
+        database.
+
+        Args:
+            key: the key.
+            default: returned if the key is not cached or has expired.
+
+        Returns:
+            the value, or default.
+        """
+        encoded = json.dumps(key)
+        value = self.memory.get(key)
+        if value is not None:
+            # What is used the most is preloaded first.
+            self.touch(encoded, time.time())
+            return value
+        try:
+            entry = self.store.read(self.name, encoded)
+        except sqlite3.Error as e:
+            print(f"Could not read from the persistent cache: {e}")
+            entry = None
+        with self.lock:
+            if entry is None:
+                self.disk_misses += 1
+                return default
+            self.disk_hits += 1
+        value, expires = entry
+        now = time.time()
+        self.memory.set(key, value, expires - now)
+        self.touch(encoded, now)
+        return value
+
+    def set(self, key, value, ttl):
+        """
+        set caches a value, in memory and, in the background, on disk.
+
+        Args:
+            key: the key.
+            value: the value.
+            ttl (float): the seconds the value stays valid.
+
+        Returns:
+            None
+        """
+        self.memory.set(key, value, ttl)
+        encoded_key = json.dumps(key)
+        encoded = json.dumps(value)
+        now = time.time()
+        self.touch(encoded_key, now, written=True)
+        self.store.put(
+            ("set", self.name, encoded_key, encoded, now + ttl, len(encoded), now)
+        )
+
+    def report(self):
+        """
+        report returns the statistics of the namespace.
+
+        Returns:
+            dict: the statistics of the entries in memory (see
+            TTLCache.report) and the hits and misses of the database.
+        """
+        with self.lock:
+            disk = {"disk_hits": self.disk_hits, "disk_misses": self.disk_misses}
+        return {**self.memory.report(), **disk}
@@ -1,3 +1,6 @@
+import urllib.parse
+
+
 def shorten(text, limit):
     """
     Shortens a string to a given length while attempting to
@@ -22,3 +25,79 @@ def shorten(text, limit):
     if text.find(" ") != -1:
         text = text[: text.rfind(" ")] + "..."
     return text
+
+
+def split_text_by_bytes(text, max_length):
+    """
+    split_text_by_bytes is a helper function that splits a utf-8 string
+    into multiple strings of a maximum byte length.
+
+    The text is encoded once and the cut points are searched for in the
+    encoded bytes, preferring to cut after a space and never cutting
+    through a multibyte character.
+
+    Args:
+        text (str or bytes): The string to split.
+        max_length (int): The maximum length of each string.
+
+    Yields:
+        The split string.
+    """
+    if isinstance(text, str):
+        data = text.encode("utf-8")
+    elif isinstance(text, bytes):
+        # Make sure the bytes are valid utf-8 before cutting them.
+        data = text.decode("utf-8").encode("utf-8")
+    else:
+        raise TypeError("text must be a string or bytes")
+    del text
+
+    start = 0
+    while len(data) - start > max_length:
+        end = start + max_length
+        # Move back to the start of the character we are cutting through,
+        # continuation bytes look like 0b10xxxxxx.
+        while end > start and data[end] & 0xC0 == 0x80:
+            end -= 1
+        if end == start:
+            # A single character does not fit, send it on its own.
+            end += 1
+            while end < len(data) and data[end] & 0xC0 == 0x80:
+                end += 1
+        else:
+            # Attempt to split at complete word.
+            space = data.rfind(b" ", start, end)
+            if space != -1:
+                end = space + 1
+        yield data[start:end].decode("utf-8")
+        start = end
+
+    if start < len(data):
+        yield data[start:].decode("utf-8")
+
+
+def normalize_url(url):
+    """
+    normalize_url returns a canonical form of a URL, so the same page posted
+    in different ways maps to the same cache key.
+
+    The scheme and host are lower-cased, default ports and the fragment are
+    removed and an empty path becomes "/".
+
+    Args:
+        url (str): the URL.
+
+    Returns:
+        str: the normalized URL.
+    """
+    parsed = urllib.parse.urlsplit(url)
+    scheme = parsed.scheme.lower()
+    netloc = parsed.netloc.lower()
+    if (scheme, netloc[-3:]) == ("http", ":80") or (scheme, netloc[-4:]) == (
+        "https",
+        ":443",
+    ):
+        netloc = netloc.rsplit(":", 1)[0]
+    return urllib.parse.urlunsplit(
+        (scheme, netloc, parsed.path or "/", parsed.query, "")
+    )
@@ -2,6 +2,8 @@
 Configuration options for the IRC bot.
 """
 
+from cache import PersistentCache
+from httpclient import HTTPClient
 from modules.ddg import DuckDuckGo
 from modules.deavmicomedy import deavmicomedy
 from modules.ping import ping
@@ -12,11 +14,70 @@ from modules.translate import Translate
 from modules.urbandict import UrbanDictionary
 from modules.urltitle import UrlTitle
 
-duckduckgo = DuckDuckGo()
+# HTTP client shared by the modules.
+http = HTTPClient(
+    # Amount of hosts to keep connections to.
+    pool_connections=16,
+    # Amount of connections (and requests at once) per host.
+    pool_maxsize=4,
+    # Amount of requests at once overall.
+    max_in_flight=16,
+    # Read timeout for requests made outside of a module deadline.
+    timeout=10,
+    # A host failing failure_threshold times in a row is skipped, and
+    # probed again every recovery_time seconds until it answers.
+    failure_threshold=5,
+    recovery_time=30,
+)
+
+# Cache kept on disk, so lookups survive restarts. Every module has its own
+# namespace, with the most used entries kept in memory and, with preload,
+# loaded into memory when starting.
+store = PersistentCache(
+    "cache",
+    # Size of all the entries on disk, the least recently used go first.
+    max_bytes=64 * 1024 * 1024,
+    # Uses of an entry are written to disk at most once in this many seconds.
+    touch_interval=5 * 60,
+)
+
+duckduckgo = DuckDuckGo(
+    http, cache=store.namespace("duckduckgo", preload=128), cache_ttl=6 * 60 * 60
+)
 sedbot = SedBot()
-translate = Translate()
-urbandictionary = UrbanDictionary()
-urltitle = UrlTitle()
+translate = Translate(
+    http, cache=store.namespace("translate", preload=128), cache_ttl=24 * 60 * 60
+)
+urbandictionary = UrbanDictionary(
+    http,
+    cache=store.namespace("urbandictionary", preload=128),
+    cache_ttl=24 * 60 * 60,
+)
+urltitle = UrlTitle(
+    http,
+    # Titles of recently posted URLs.
+    cache=store.namespace(
+        "urltitle", max_entries=2048, max_bytes=2 * 1024 * 1024, preload=512
+    ),
+    # The URLs of one message are fetched at the same time, a URL taking
+    # longer than link_timeout seconds is skipped.
+    workers=8,
+    concurrency=3,
+    link_timeout=10,
+    # HTML pages are read up to the end of their head, or up to max_bytes.
+    # Other files only up to what identifies them, or up to probe_bytes.
+    max_bytes=65536,
+    probe_bytes=16384,
+    # Invidious instances YouTube videos are looked up on: the fastest one
+    # that works is used, one that fails is skipped for a while.
+    youtube_backends=["https://invidious.snopyta.org", "https://yewtu.be"],
+    # Info of recently posted YouTube videos, by video id.
+    video_cache=store.namespace("youtube", max_entries=512, max_bytes=512 * 1024),
+    # Destinations of recently posted short links, by the link.
+    redirect_cache=store.namespace(
+        "redirects", max_entries=2048, max_bytes=512 * 1024, preload=512
+    ),
+)
 
 SERVER_ADDR = "fdfb:1a20:a9bf:1000::7ab8"
 SERVER_PORT = 6667
@@ -24,9 +85,8 @@ SERVER_PASS = "none"
 SERVER_NICK = "ranybottyforrnb"
 NICKSERV_PASS = None
 CHANNELS_TO_JOIN = ["#rany2", "#general"]
-# Order matters.
+# Commands are looked up by name, the other modules are run in this order.
 MODULES = [
-    # These are commands and they must be specified first.
     duckduckgo.duckduckgo,
     deavmicomedy,
     ping,
@@ -35,7 +95,26 @@ MODULES = [
     sedbot.sed,
     translate.translate,
     urbandictionary.mkurbandict,
-    # This function will always be run.
     urltitle.urltitle,
 ]
 MODULES_BACKGROUND = []
+# Amount of threads used to run MODULES, messages beyond that wait their turn.
+# Messages from the same channel or nick are always handled in order.
+MODULE_WORKERS = 8
+# Amount of messages that can wait per channel or nick, and overall.
+SOURCE_QUEUE_SIZE = 32
+MAX_PENDING = 256
+# What to do with messages when there is no room: "drop" them, or "block"
+# reading from the server until there is (which can delay PONGs).
+OVERLOAD_POLICY = "drop"
+# Time budget in seconds of a module handling a message, HTTP requests and
+# subprocesses of the module are cut off when it runs out.
+MODULE_TIMEOUT = 15
+# Time budget per module, by function name.
+MODULE_TIMEOUTS = {"ping": 5}
+# Seconds after which the bot stops waiting on a message and moves on to the
+# next one from the same channel.
+MESSAGE_TIMEOUT = 60
+# Flood control: at most FLOOD_BURST lines at once, then FLOOD_RATE lines per second.
+FLOOD_BURST = 5
+FLOOD_RATE = 0.5
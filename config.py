@@ -0,0 +1,30 @@
+from httpclient import HTTPClient
+from modules.ddg import DuckDuckGo
+http = HTTPClient()
+from modules.deavmicomedy import deavmicomedy
+from modules.ping import ping
+from modules.reversed import mkreversed
+from modules.rot13 import rot13
+from modules.sedbot import SedBot
+from modules.translate import Translate
+from modules.urbandict import UrbanDictionary
+from modules.urltitle import UrlTitle
+sedbot = SedBot()
+urltitle = UrlTitle(http)
+SERVER_ADDR = "::1"
+SERVER_PORT = 16667
+SERVER_PASS = "none"
+SERVER_NICK = "bot"
+NICKSERV_PASS = None
+CHANNELS_TO_JOIN = ["#chan"]
+MODULES = [DuckDuckGo(http).duckduckgo, deavmicomedy, ping, mkreversed, rot13, sedbot.sed, Translate(http).translate, UrbanDictionary(http).mkurbandict, urltitle.urltitle]
+MODULES_BACKGROUND = []
+MODULE_WORKERS = 8
+FLOOD_BURST = 5
+FLOOD_RATE = 20
+SOURCE_QUEUE_SIZE = 32
+MAX_PENDING = 256
+OVERLOAD_POLICY = "drop"
+MODULE_TIMEOUT = 15
+MODULE_TIMEOUTS = {"ping": 2}
+MESSAGE_TIMEOUT = 60
@@ -0,0 +1,108 @@
+"""
+Per-message context handed to botty modules.
+"""
+
+import functools
+
+from regexes import ircspecial, urlregex
+
+
+class MessageContext:
+    """
+    MessageContext is a PRIVMSG received by the bot along with the fields
+    modules derive from it. The derived fields are computed the first time
+    a module uses them and then shared with every other module.
+
+    Attributes:
+        msg (IRCMessage): the parsed message.
+        nick (str): the nick of the user who sent the message.
+        source (str): the channel or nick the message came from, the nick
+        when the message was sent to the bot directly.
+        privmsg (str): the message.
+        netmask (str): the netmask of the user who sent the message, without
+        the leading colon (see legacy_netmask).
+        is_channel (bool): whether or not the message was sent in a channel.
+    """
+
+    def __init__(self, msg):
+        """
+        __init__ is the constructor for the MessageContext class.
+
+        Args:
+            msg (IRCMessage): a PRIVMSG with at least two parameters.
+        """
+        self.msg = msg
+        self.nick = msg.nick
+        self.source = msg.params[0]
+        self.privmsg = msg.params[1]
+        self.netmask = msg.prefix
+        self.is_channel = True
+        # If the message was not received from the channel,
+        # we set the source to the nick so the rest of the code
+        # is not broken by the fact that the source is not a channel
+        if not self.source.startswith("#"):
+            self.source = self.nick
+            self.is_channel = False
+
+    @functools.cached_property
+    def text(self):
+        """
+        text is the message with the IRC formatting removed.
+        """
+        return ircspecial.sub("", self.privmsg)
+
+    @functools.cached_property
+    def command(self):
+        """
+        command is the first word of the message up to a colon, e.g. ".tr"
+        for ".tr:de hallo".
+        """
+        return self.privmsg.split(" ", 1)[0].split(":", 1)[0]
+
+    @functools.cached_property
+    def option(self):
+        """
+        option is what follows the colon in the first word, e.g. "de" for
+        ".tr:de hallo", None if there is no colon.
+        """
+        word = self.privmsg.split(" ", 1)[0]
+        if ":" not in word:
+            return None
+        return word.split(":", 1)[1]
+
+    @functools.cached_property
+    def args(self):
+        """
+        args is everything after the first word with the IRC formatting
+        removed.
+        """
+        try:
+            return ircspecial.sub("", self.privmsg.split(" ", 1)[1])
+        except IndexError:
+            return ""
+
+    @functools.cached_property
+    def urls(self):
+        """
+        urls is the list of URLs found in the message.
+        """
+        return [match.group(0) for match in urlregex.finditer(self.text)]
+
+    @functools.cached_property
+    def legacy_netmask(self):
+        """
+        legacy_netmask is the netmask with the leading colon, the way it was
+        given to modules before MessageContext, e.g. ":nick!user@host".
+        """
+        if self.netmask is None:
+            return None
+        return ":" + self.netmask
+
+    @functools.cached_property
+    def userhost(self):
+        """
+        userhost is the user@host part of the netmask.
+        """
+        if self.msg.user is not None and self.msg.host is not None:
+            return f"{self.msg.user}@{self.msg.host}"
+        return "!".join(self.netmask.split("!")[1:])
@@ -0,0 +1,124 @@
+"""
+Time budgets for modules.
+
+The dispatcher gives every module a deadline before running it. The
+deadline belongs to the worker thread running the module, so the helpers
+here can be used anywhere below the module (HTTP requests, subprocesses)
+without passing it around.
+"""
+
+import contextlib
+import threading
+import time
+
+# Connect timeout used for HTTP requests, as long as the deadline allows it.
+CONNECT_TIMEOUT = 5
+
+_local = threading.local()
+
+
+class DeadlineExceeded(Exception):
+    """
+    DeadlineExceeded is raised when a module is out of time.
+    """
+
+    pass
+
+
+class Deadline:
+    """
+    Deadline is a point in time a module must be done by.
+    """
+
+    def __init__(self, seconds):
+        """
+        __init__ is the constructor for the Deadline class.
+
+        Args:
+            seconds (float): the time budget.
+        """
+        self.seconds = seconds
+        self.expires = time.monotonic() + seconds
+
+    def remaining(self):
+        """
+        remaining returns the seconds left until the deadline.
+        """
+        return max(0.0, self.expires - time.monotonic())
+
+    def expired(self):
+        """
+        expired returns whether the deadline has passed.
+        """
+        return time.monotonic() >= self.expires
+
+
+@contextlib.contextmanager
+def budget(seconds):
+    """
+    budget sets the deadline of the current thread for the duration of the
+    with block.
+
+    Args:
+        seconds (float): the time budget, None for no deadline.
+
+    Yields:
+        Deadline: the deadline, or None.
+    """
+    previous = getattr(_local, "deadline", None)
+    _local.deadline = None if seconds is None else Deadline(seconds)
+    try:
+        yield _local.deadline
+    finally:
+        _local.deadline = previous
+
+
+def current():
+    """
+    current returns the deadline of the current thread, or None.
+    """
+    return getattr(_local, "deadline", None)
+
+
+def remaining(default=None):
+    """
+    remaining returns the seconds left for the current thread.
+
+    Args:
+        default (float): returned when there is no deadline.
+
+    Raises:
+        DeadlineExceeded if the deadline has passed.
+    """
+    deadline = current()
+    if deadline is None:
+        return default
+    left = deadline.remaining()
+    if left <= 0:
+        raise DeadlineExceeded(f"Deadline of {deadline.seconds}s exceeded.")
+    return left
+
+
+def check():
+    """
+    check raises DeadlineExceeded if the deadline of the current thread has
+    passed, modules call it between steps of long running work.
+    """
+    remaining()
+
+
+def http_timeout(read=None):
+    """
+    http_timeout returns a (connect, read) timeout for requests that does
+    not go past the deadline of the current thread.
+
+    Args:
+        read (float): the read timeout to use when there is no deadline.
+
+    Raises:
+        DeadlineExceeded if the deadline has passed.
+    """
+    left = remaining(read)
+    if left is None:
+        return (CONNECT_TIMEOUT, None)
+    return (min(CONNECT_TIMEOUT, left), left)
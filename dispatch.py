@@ -0,0 +1,171 @@
+"""
+Message dispatching for botty modules.
+
+Modules declare what they react to with the command and passive decorators
+and are called with the MessageContext of the message:
+
+    @command(".rev")
+    def mkreversed(ctx, send_message):
+        ...
+
+    @passive(lambda ctx: "://" in ctx.privmsg)
+    def urltitle(ctx, send_message):
+        ...
+
+Commands are looked up by the first word of the message (up to a colon, so
+".tr:de" is the ".tr" command). Passive modules are run in order when no
+command handled the message, but only if their precondition matches.
+Modules without a declaration are passive modules that always run, they
+are called the old way with
+(nick, source, privmsg, netmask, is_channel, send_message), the netmask
+starting with a colon as it always did.
+
+Every module runs with a deadline (see deadline.py), configurable per
+module name.
+"""
+
+import collections
+import functools
+import threading
+
+import deadline
+
+
+def command(*names):
+    """
+    command declares the commands a module handles.
+
+    Args:
+        names (str): the commands, e.g. ".ddg".
+
+    Returns:
+        function: the decorator.
+    """
+
+    def decorator(function):
+        function.commands = names
+        return function
+
+    return decorator
+
+
+def passive(precondition=None):
+    """
+    passive declares a module that looks at every message.
+
+    Args:
+        precondition (function): a cheap check taking the MessageContext, the
+        module is only run if it returns True. None to always run it.
+
+    Returns:
+        function: the decorator.
+    """
+
+    def decorator(function):
+        function.precondition = precondition
+        return function
+
+    return decorator
+
+
+def legacy_module(module):
+    """
+    legacy_module adapts a module without a declaration to be called with a
+    MessageContext.
+
+    Args:
+        module (function): the module.
+
+    Returns:
+        function: the adapted module.
+    """
+
+    @functools.wraps(module)
+    def wrapper(ctx, send_message):
+        return module(
+            ctx.nick,
+            ctx.source,
+            ctx.privmsg,
+            ctx.legacy_netmask,
+            ctx.is_channel,
+            send_message,
+        )
+
+    return wrapper
+
+
+class Dispatcher:
+    """
+    Dispatcher routes messages to the modules that handle them.
+    """
+
+    def __init__(self, modules, timeout=None, timeouts=None):
+        """
+        __init__ is the constructor for the Dispatcher class.
+
+        Args:
+            modules (list): the modules, passive modules are run in this order.
+            timeout (float): the time budget of a module, None for no limit.
+            timeouts (dict): the time budget per module name, overriding timeout.
+
+        Raises:
+            ValueError if two modules handle the same command.
+        """
+        self.timeout = timeout
+        self.timeouts = timeouts or {}
+        self.deadline_hits = collections.Counter()
+        self.lock = threading.Lock()
+        self.commands = {}
+        self.passive = []
+        for module in modules:
+            for name in getattr(module, "commands", ()):
+                if name in self.commands:
+                    raise ValueError(f"Command {name} is handled twice.")
+                self.commands[name] = module
+            if hasattr(module, "precondition"):
+                self.passive.append((module.precondition, module))
+            elif not hasattr(module, "commands"):
+                self.passive.append((None, legacy_module(module)))
+
+    def dispatch(self, ctx, send_message):
+        """
+        dispatch runs the modules for a message until one of them handles it.
+
+        Args:
+            ctx (MessageContext): the message
+            send_message (function): a function used to send a message to the correct location
+
+        Returns:
+            True if a module handled the message, None otherwise.
+        """
+        args = (ctx, send_message)
+        module = self.commands.get(ctx.command)
+        if module is not None and self.run(module, args) == True:
+            return True
+        for precondition, module in self.passive:
+            if precondition is not None and not precondition(ctx):
+                continue
+            if self.run(module, args) == True:
+                return True
+        return None
+
+    def run(self, module, args):
+        """
+        run runs a single module within its deadline, reporting its errors
+        and counting the times it ran out of time.
+        """
+        name = module.__name__
+        with deadline.budget(self.timeouts.get(name, self.timeout)) as budget:
+            try:
+                return module(*args)
+            except Exception as e:
+                print(f"Error: {e}")
+                return None
+            finally:
+                if budget is not None and budget.expired():
+                    with self.lock:
+                        self.deadline_hits[name] += 1
+                        hits = self.deadline_hits[name]
+                    print(
+                        f"{name} hit its deadline of {budget.seconds}s ({hits} times)"
+                    )
@@ -0,0 +1,449 @@
+"""
+HTTP client shared by the botty modules.
+"""
+
+import collections
+import functools
+import threading
+import time
+import urllib.parse
+
+import requests
+import requests.adapters
+import urllib3.connectionpool
+
+import deadline
+
+
+class CircuitOpen(requests.exceptions.ConnectionError):
+    """
+    CircuitOpen is raised instead of making a request to a host that has
+    been failing, until it answers again.
+    """
+
+    pass
+
+
+class HostSlots:
+    """
+    HostSlots limits the requests made to a host at once, and counts the
+    requests using it so it is only forgotten when unused.
+    """
+
+    def __init__(self, slots):
+        self.slots = threading.BoundedSemaphore(slots)
+        self.users = 0
+
+
+class HostHealth:
+    """
+    HostHealth is how a host has been doing: its failures in a row, its
+    average latency and the state of its circuit.
+
+    The circuit opens after failure_threshold failures in a row. Requests
+    to the host then fail fast with CircuitOpen, and once recovery_time has
+    passed the host is probed in the background, the circuit closes when it
+    answers and stays open for another recovery_time otherwise.
+    """
+
+    def __init__(self):
+        self.failures = 0
+        self.latency = None
+        self.opened = None
+        self.probing = False
+
+
+class HTTPStats:
+    """
+    HTTPStats counts what the HTTP client does, it is shared by the client
+    and its connection pools.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.connections = 0
+        self.failures = 0
+        self.rejected = 0
+        self.probes = 0
+        self.waits = 0
+        self.wait_time = 0.0
+
+    def add(self, **counts):
+        """
+        add adds to the counters.
+        """
+        with self.lock:
+            for name, count in counts.items():
+                setattr(self, name, getattr(self, name) + count)
+
+
+class CountingHTTPConnectionPool(urllib3.connectionpool.HTTPConnectionPool):
+    """
+    CountingHTTPConnectionPool is a connection pool that counts the new
+    connections it opens.
+    """
+
+    def __init__(self, *args, stats=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = stats
+
+    def _new_conn(self):
+        self.stats.add(connections=1)
+        return super()._new_conn()
+
+
+class CountingHTTPSConnectionPool(urllib3.connectionpool.HTTPSConnectionPool):
+    """
+    CountingHTTPSConnectionPool is a connection pool that counts the new
+    connections it opens.
+    """
+
+    def __init__(self, *args, stats=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = stats
+
+    def _new_conn(self):
+        self.stats.add(connections=1)
+        return super()._new_conn()
+
+
+class CountingAdapter(requests.adapters.HTTPAdapter):
+    """
+    CountingAdapter is a requests adapter whose connection pools count the
+    connections they open.
+    """
+
+    def __init__(self, stats, **kwargs):
+        self.stats = stats
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": functools.partial(CountingHTTPConnectionPool, stats=self.stats),
+            "https": functools.partial(CountingHTTPSConnectionPool, stats=self.stats),
+        }
+
+
+class HTTPClient:
+    """
+    HTTPClient is the HTTP client the modules are given. It keeps a pool of
+    keep-alive connections per host, limits how many requests are made at
+    once (overall and per host) and applies the deadline of the calling
+    module to every request.
+
+    It also keeps the health of every host (see HostHealth), requests to a
+    host that keeps failing are rejected with CircuitOpen instead of waiting
+    for it to time out again.
+    """
+
+    # Responses that mean the host, or what is behind it, is down.
+    DOWN_STATUSES = frozenset({502, 503, 504})
+
+    def __init__(
+        self,
+        pool_connections=16,
+        pool_maxsize=4,
+        max_in_flight=16,
+        timeout=10,
+        headers=None,
+        failure_threshold=5,
+        recovery_time=30,
+        probe_timeout=5,
+        latency_alpha=0.3,
+        max_hosts=None,
+    ):
+        """
+        __init__ is the constructor for the HTTPClient class.
+
+        Args:
+            pool_connections (int): the amount of hosts to keep connections to.
+            pool_maxsize (int): the amount of connections per host, and the
+            amount of requests made to a host at once.
+            max_in_flight (int): the amount of requests made at once.
+            timeout (float): the read timeout of requests made outside of a
+            module deadline.
+            headers (dict): headers sent with every request.
+            failure_threshold (int): the failures in a row (connection
+            errors, timeouts, 502, 503 and 504 responses) after which the
+            circuit of a host opens.
+            recovery_time (float): seconds after which a host whose circuit
+            is open is probed again.
+            probe_timeout (float): the timeout of the probes.
+            latency_alpha (float): the weight of the last response time in
+            the average latency of a host.
+            max_hosts (int): the amount of hosts whose limits and health are
+            kept, 4 * pool_connections if None. Past that, the least
+            recently used hosts that are not in use are forgotten.
+        """
+        self.stats = HTTPStats()
+        self.session = requests.Session()
+        adapter = CountingAdapter(
+            self.stats, pool_connections=pool_connections, pool_maxsize=pool_maxsize
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        if headers:
+            self.session.headers.update(headers)
+        self.timeout = timeout
+        self.pool_maxsize = pool_maxsize
+        self.in_flight = threading.BoundedSemaphore(max_in_flight)
+        self.max_hosts = max_hosts or 4 * pool_connections
+        self.hosts = collections.OrderedDict()
+        self.hosts_lock = threading.Lock()
+        self.failure_threshold = failure_threshold
+        self.recovery_time = recovery_time
+        self.probe_timeout = probe_timeout
+        self.latency_alpha = latency_alpha
+        self.health = collections.OrderedDict()
+        self.health_lock = threading.Lock()
+
+    def host_slots(self, host):
+        """
+        host_slots returns the slots limiting the requests to a host, call
+        release_host once done with them.
+        """
+        with self.hosts_lock:
+            slots = self.hosts.get(host)
+            if slots is None:
+                slots = self.hosts[host] = HostSlots(self.pool_maxsize)
+                if len(self.hosts) > self.max_hosts:
+                    for other in [
+                        other
+                        for other, other_slots in self.hosts.items()
+                        if other_slots.users == 0 and other != host
+                    ][: len(self.hosts) - self.max_hosts]:
+                        del self.hosts[other]
+            else:
+                self.hosts.move_to_end(host)
+            slots.users += 1
+            return slots
+
+    def release_host(self, slots):
+        """
+        release_host gives back slots returned by host_slots.
+        """
+        with self.hosts_lock:
+            slots.users -= 1
+
+    def acquire(self, slots):
+        """
+        acquire waits for a slot without going past the deadline.
+
+        Raises:
+            DeadlineExceeded if the deadline passed while waiting.
+        """
+        if slots.acquire(blocking=False):
+            return
+        start = time.monotonic()
+        acquired = slots.acquire(timeout=deadline.remaining())
+        self.stats.add(waits=1, wait_time=time.monotonic() - start)
+        if not acquired:
+            raise deadline.DeadlineExceeded(
+                "Deadline exceeded waiting for a connection."
+            )
+
+    def host_health(self, host):
+        """
+        host_health returns the health of a host, health_lock must be held.
+
+        Past max_hosts, the least recently used hosts are forgotten, the
+        ones whose circuit opened less than recovery_time ago last and the
+        ones being probed never.
+        """
+        health = self.health.get(host)
+        if health is not None:
+            self.health.move_to_end(host)
+            return health
+        health = self.health[host] = HostHealth()
+        if len(self.health) > self.max_hosts:
+            now = time.monotonic()
+            healthy, down = [], []
+            for other, other_health in self.health.items():
+                if other == host or other_health.probing:
+                    continue
+                if (
+                    other_health.opened is None
+                    or now - other_health.opened >= self.recovery_time
+                ):
+                    healthy.append(other)
+                else:
+                    down.append(other)
+            for other in (healthy + down)[: len(self.health) - self.max_hosts]:
+                del self.health[other]
+        return health
+
+    def available(self, url):
+        """
+        available returns whether requests to the host of a URL are made,
+        that is whether its circuit is closed.
+        """
+        host = urllib.parse.urlsplit(url).netloc.lower()
+        with self.health_lock:
+            health = self.health.get(host)
+            return health is None or health.opened is None
+
+    def check_circuit(self, url):
+        """
+        check_circuit rejects requests to a host whose circuit is open, and
+        starts probing the host once it has been open for recovery_time.
+
+        Raises:
+            CircuitOpen if the circuit of the host is open.
+        """
+        parsed = urllib.parse.urlsplit(url)
+        host = parsed.netloc.lower()
+        with self.health_lock:
+            health = self.health.get(host)
+            if health is None or health.opened is None:
+                return
+            probe = (
+                not health.probing
+                and time.monotonic() - health.opened >= self.recovery_time
+            )
+            health.probing = health.probing or probe
+        self.stats.add(rejected=1)
+        if probe:
+            threading.Thread(
+                target=self.probe,
+                args=(host, f"{parsed.scheme}://{parsed.netloc}/"),
+                name=f"probe {host}",
+                daemon=True,
+            ).start()
+        raise CircuitOpen(f"{host} is down, not making requests to it.")
+
+    def probe(self, host, url):
+        """
+        probe checks whether a host whose circuit is open answers, closing
+        the circuit if it does.
+        """
+        self.stats.add(probes=1)
+        try:
+            response = self.session.head(
+                url, allow_redirects=False, timeout=self.probe_timeout
+            )
+            response.close()
+            up = response.status_code not in self.DOWN_STATUSES
+        except requests.exceptions.RequestException:
+            up = False
+        with self.health_lock:
+            health = self.host_health(host)
+            health.probing = False
+            if up:
+                health.failures = 0
+                health.opened = None
+            else:
+                health.opened = time.monotonic()
+        print(f"Probed {host}: {'up' if up else 'still down'}")
+
+    def record(self, host, failed, seconds=None):
+        """
+        record adds the outcome of a request to the health of a host,
+        opening its circuit after failure_threshold failures in a row.
+        """
+        with self.health_lock:
+            health = self.host_health(host)
+            if not failed:
+                health.failures = 0
+                if health.latency is None:
+                    health.latency = seconds
+                else:
+                    health.latency += self.latency_alpha * (seconds - health.latency)
+                return
+            health.failures += 1
+            if health.failures >= self.failure_threshold and health.opened is None:
+                health.opened = time.monotonic()
+                print(f"{host} failed {health.failures} times in a row, skipping it")
+        self.stats.add(failures=1)
+
+    def request(self, method, url, **kwargs):
+        """
+        request makes an HTTP request, see requests.Session.request.
+
+        The in-flight limits are held until the response headers are
+        received, the timeout defaults to the deadline of the calling module.
+
+        Raises:
+            DeadlineExceeded if the deadline passed.
+            CircuitOpen if the host has been failing.
+            requests.exceptions.RequestException if the request failed.
+        """
+        self.check_circuit(url)
+        kwargs.setdefault("timeout", deadline.http_timeout(self.timeout))
+        host_slots = self.host_slots(urllib.parse.urlsplit(url).netloc.lower())
+        try:
+            self.acquire(self.in_flight)
+            try:
+                self.acquire(host_slots.slots)
+                try:
+                    self.stats.add(requests=1)
+                    start = time.monotonic()
+                    try:
+                        response = self.session.request(method, url, **kwargs)
+                    except (
+                        requests.exceptions.ConnectionError,
+                        requests.exceptions.Timeout,
+                    ) as e:
+                        # Redirects may have led to another host.
+                        failed_url = e.request.url if e.request is not None else url
+                        self.record(
+                            urllib.parse.urlsplit(failed_url).netloc.lower(), True
+                        )
+                        raise
+                    self.record(
+                        urllib.parse.urlsplit(response.url).netloc.lower(),
+                        response.status_code in self.DOWN_STATUSES,
+                        time.monotonic() - start,
+                    )
+                    return response
+                finally:
+                    host_slots.slots.release()
+            finally:
+                self.in_flight.release()
+        finally:
+            self.release_host(host_slots)
+
+    def get(self, url, **kwargs):
+        """
+        get makes a GET request, see request.
+        """
+        return self.request("GET", url, **kwargs)
+
+    def head(self, url, **kwargs):
+        """
+        head makes a HEAD request, see request.
+        """
+        return self.request("HEAD", url, **kwargs)
+
+    def report(self):
+        """
+        report returns the statistics of the client.
+
+        Returns:
+            dict: the amount of requests, connections opened, connection
+            reuse rate, waits for a free slot with their total time, failed
+            requests, requests rejected by an open circuit, probes, and the
+            hosts whose circuit is open.
+        """
+        with self.health_lock:
+            down = sorted(
+                host
+                for host, health in self.health.items()
+                if health.opened is not None
+            )
+        stats = self.stats
+        with stats.lock:
+            return {
+                "requests": stats.requests,
+                "connections": stats.connections,
+                "reuse_rate": (
+                    1 - stats.connections / stats.requests if stats.requests else 0.0
+                ),
+                "waits": stats.waits,
+                "wait_time": stats.wait_time,
+                "failures": stats.failures,
+                "rejected": stats.rejected,
+                "probes": stats.probes,
+                "down": down,
+            }
@@ -0,0 +1,173 @@
+"""
+Helpers for speaking the IRC protocol.
+"""
+
+# 512 bytes for the message itself plus 8191 bytes for IRCv3 message tags.
+MAX_LINE_LENGTH = 512 + 8191
+
+
+class LineFramer:
+    """
+    LineFramer splits the byte stream received from the IRC server into
+    complete lines. Partial lines are kept in a reusable buffer until the
+    rest of them arrives.
+    """
+
+    def __init__(self, max_line_length=MAX_LINE_LENGTH):
+        """
+        __init__ is the constructor for the LineFramer class.
+
+        Args:
+            max_line_length (int): lines longer than this are dropped.
+        """
+        self.buffer = bytearray()
+        self.max_line_length = max_line_length
+        # Set while the rest of an overly long line is being skipped.
+        self.discarding = False
+
+    def feed(self, data):
+        """
+        feed adds received data to the buffer and returns every line that
+        is now complete.
+
+        Args:
+            data (bytes): the data received from the socket.
+
+        Returns:
+            list: the complete lines (bytes) without the line ending.
+        """
+        buffer = self.buffer
+        buffer += data
+        end = buffer.rfind(b"\n")
+        if end == -1:
+            if len(buffer) > self.max_line_length:
+                del buffer[:]
+                self.discarding = True
+            return []
+
+        lines = bytes(buffer[:end]).split(b"\n")
+        del buffer[: end + 1]
+        if self.discarding:
+            # The first line is the tail of the line we are dropping.
+            del lines[0]
+            self.discarding = False
+        if len(buffer) > self.max_line_length:
+            del buffer[:]
+            self.discarding = True
+        lines = [line.rstrip(b"\r") for line in lines]
+        # Lines received whole are as long as the ones dropped above.
+        max_line_length = self.max_line_length
+        return [line for line in lines if line and len(line) <= max_line_length]
+
+
+# Escapes used in IRCv3 message tag values.
+TAG_ESCAPES = {":": ";", "s": " ", "\\": "\\", "r": "\r", "n": "\n"}
+
+
+def unescape_tag_value(value):
+    """
+    unescape_tag_value unescapes the value of an IRCv3 message tag.
+
+    Args:
+        value (str): the escaped value.
+
+    Returns:
+        str: the unescaped value.
+    """
+    if "\\" not in value:
+        return value
+    unescaped = []
+    escaped = False
+    for character in value:
+        if escaped:
+            unescaped.append(TAG_ESCAPES.get(character, character))
+            escaped = False
+        elif character == "\\":
+            escaped = True
+        else:
+            unescaped.append(character)
+    return "".join(unescaped)
+
+
+class IRCMessage:
+    """
+    IRCMessage is a message received from the IRC server, parsed once.
+
+    Attributes:
+        raw (str): the line as received.
+        tags (dict): the IRCv3 message tags, a tag without value maps to "".
+        prefix (str): the prefix without the leading colon, or None.
+        nick (str): the nick (or server name) from the prefix, or None.
+        user (str): the user from the prefix, or None.
+        host (str): the host from the prefix, or None.
+        command (str): the command or numeric, upper-cased.
+        params (list): all parameters, including the trailing one.
+        trailing (str): the trailing parameter (after " :"), or None.
+    """
+
+    __slots__ = (
+        "raw",
+        "tags",
+        "prefix",
+        "nick",
+        "user",
+        "host",
+        "command",
+        "params",
+        "trailing",
+    )
+
+    def __init__(self, line):
+        """
+        __init__ parses a line received from the IRC server.
+
+        Args:
+            line (str): the line without the line ending.
+
+        Raises:
+            ValueError if the line has no command.
+        """
+        self.raw = line
+        rest = line
+
+        self.tags = tags = {}
+        if line.startswith("@"):
+            raw_tags, _, rest = line[1:].partition(" ")
+            for tag in raw_tags.split(";"):
+                key, _, value = tag.partition("=")
+                if key:
+                    tags[key] = unescape_tag_value(value) if "\\" in value else value
+            rest = rest.lstrip(" ")
+
+        if rest.startswith(":"):
+            self.prefix, _, rest = rest[1:].partition(" ")
+            rest = rest.lstrip(" ")
+            nick, bang, userhost = self.prefix.partition("!")
+            if bang:
+                user, at, host = userhost.partition("@")
+                self.nick, self.user, self.host = nick, user, host if at else None
+            else:
+                nick, at, host = nick.partition("@")
+                self.nick, self.user, self.host = nick, None, host if at else None
+        else:
+            self.prefix = self.nick = self.user = self.host = None
+
+        if rest.startswith(":"):
+            raise ValueError(f"Malformed IRC message: {line!r}")
+        rest, separator, trailing = rest.partition(" :")
+        params = rest.split(" ")
+        if "" in params:
+            params = [param for param in params if param]
+        if not params:
+            raise ValueError(f"Malformed IRC message: {line!r}")
+        self.command = params[0].upper()
+        del params[0]
+        if separator:
+            self.trailing = trailing
+            params.append(trailing)
+        else:
+            self.trailing = None
+        self.params = params
+
+    def __repr__(self):
+        return f"IRCMessage({self.raw!r})"
@@ -0,0 +1,228 @@
+"""
+Identification of media files from their first bytes.
+
+UrlTitle describes images and videos from the first few KB of the file
+instead of downloading it: the dimensions of PNG, JPEG, GIF and WebP
+images and the dimensions and duration of MP4 videos are in their headers.
+"""
+
+import collections
+import struct
+
+Media = collections.namedtuple("Media", ["format", "width", "height", "duration"])
+Media.__doc__ = "A media file: its format, dimensions and duration in seconds."
+
+# JPEG start of frame markers, they hold the dimensions of the image.
+JPEG_SOF = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+# ISO base media file brands, by the first four bytes of the major brand.
+MP4_BRANDS = {
+    b"qt  ": "QuickTime video",
+    b"M4A ": "MPEG-4 audio",
+    b"3gp4": "3GPP video",
+    b"3gp5": "3GPP video",
+    b"3gp6": "3GPP video",
+}
+
+
+class NeedMore(Exception):
+    """
+    NeedMore is raised when the format is known but the data ends before
+    the information wanted.
+    """
+
+    pass
+
+
+def probe(data, final=False):
+    """
+    probe identifies a media file from its first bytes.
+
+    Args:
+        data (bytes): the start of the file.
+        final (bool): whether there is no more data to come, in which case
+        what could be found is returned instead of raising NeedMore.
+
+    Raises:
+        NeedMore if more data is needed and final is False.
+
+    Returns:
+        Media: the media, None if the format is not one of PNG, JPEG, GIF,
+        WebP or MP4.
+    """
+    for signature, function in PROBES:
+        if data.startswith(signature):
+            break
+    else:
+        if data[4:8] != b"ftyp":
+            return None
+        function = probe_mp4
+    try:
+        return function(data)
+    except NeedMore as partial:
+        if not final:
+            raise
+        return partial.args[0]
+    except struct.error:
+        # A corrupt header the checks of the probes missed, the file is
+        # described some other way.
+        return None
+
+
+def probe_png(data):
+    """
+    probe_png reads the dimensions of a PNG image from its IHDR chunk.
+    """
+    if len(data) < 24:
+        raise NeedMore(Media("PNG image", None, None, None))
+    width, height = struct.unpack(">II", data[16:24])
+    return Media("PNG image", width, height, None)
+
+
+def probe_gif(data):
+    """
+    probe_gif reads the dimensions of a GIF image from its screen
+    descriptor.
+    """
+    if len(data) < 10:
+        raise NeedMore(Media("GIF image", None, None, None))
+    width, height = struct.unpack("<HH", data[6:10])
+    return Media("GIF image", width, height, None)
+
+
+def probe_jpeg(data):
+    """
+    probe_jpeg reads the dimensions of a JPEG image from its start of frame
+    segment, skipping the segments before it.
+    """
+    position = 2
+    while True:
+        if position + 4 > len(data):
+            raise NeedMore(Media("JPEG image", None, None, None))
+        if data[position] != 0xFF:
+            return Media("JPEG image", None, None, None)
+        marker = data[position + 1]
+        if marker == 0xFF:
+            # Fill byte.
+            position += 1
+            continue
+        if marker in JPEG_SOF:
+            if position + 9 > len(data):
+                raise NeedMore(Media("JPEG image", None, None, None))
+            height, width = struct.unpack(">HH", data[position + 5 : position + 9])
+            return Media("JPEG image", width, height, None)
+        (length,) = struct.unpack(">H", data[position + 2 : position + 4])
+        position += 2 + length
+
+
+def probe_webp(data):
+    """
+    probe_webp reads the dimensions of a WebP image from its first chunk.
+    """
+    if data[8:12] != b"WEBP":
+        return None
+    if len(data) < 30:
+        raise NeedMore(Media("WebP image", None, None, None))
+    chunk = data[12:16]
+    if chunk == b"VP8 ":
+        width, height = struct.unpack("<HH", data[26:30])
+        return Media("WebP image", width & 0x3FFF, height & 0x3FFF, None)
+    if chunk == b"VP8L":
+        (bits,) = struct.unpack("<I", data[21:25])
+        return Media(
+            "WebP image", (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1, None
+        )
+    if chunk == b"VP8X":
+        width = int.from_bytes(data[24:27], "little") + 1
+        height = int.from_bytes(data[27:30], "little") + 1
+        return Media("WebP image", width, height, None)
+    return Media("WebP image", None, None, None)
+
+
+def boxes(data, start, end):
+    """
+    boxes iterates over the ISO base media file boxes between start and
+    end.
+
+    Yields:
+        tuple: the type of the box, the start and the end of its content.
+        The end may be past the end of data.
+    """
+    position = start
+    while position + 8 <= end:
+        size, kind = struct.unpack(">I4s", data[position : position + 8])
+        header = 8
+        if size == 1:
+            if position + 16 > len(data):
+                return
+            (size,) = struct.unpack(">Q", data[position + 8 : position + 16])
+            header = 16
+        elif size == 0:
+            size = end - position
+        if size < header:
+            return
+        yield kind, position + header, position + size
+        position += size
+
+
+def probe_mp4(data):
+    """
+    probe_mp4 reads the duration and the dimensions of an MP4 video from its
+    moov box, which must come before the media data.
+    """
+    media = Media(MP4_BRANDS.get(data[8:12], "MP4 video"), None, None, None)
+    for kind, start, end in boxes(data, 0, len(data)):
+        if kind == b"mdat":
+            # The moov box is at the end of the file.
+            return media
+        if kind != b"moov":
+            continue
+        if end > len(data):
+            raise NeedMore(media)
+        return mp4_moov(data, start, end, media)
+    raise NeedMore(media)
+
+
+def mp4_moov(data, start, end, media):
+    """
+    mp4_moov reads the duration and the dimensions of the first video track
+    from a complete moov box.
+    """
+    duration = width = height = None
+    for kind, box_start, box_end in boxes(data, start, end):
+        if box_end > end:
+            # Corrupt, the box does not fit in its parent.
+            break
+        if kind == b"mvhd":
+            if box_end - box_start >= 32 and data[box_start] == 1:
+                timescale, length = struct.unpack(
+                    ">IQ", data[box_start + 20 : box_start + 32]
+                )
+            elif box_end - box_start >= 20 and data[box_start] == 0:
+                timescale, length = struct.unpack(
+                    ">II", data[box_start + 12 : box_start + 20]
+                )
+            else:
+                continue
+            if timescale:
+                duration = length / timescale
+        elif kind == b"trak" and width is None:
+            for track_kind, track_start, track_end in boxes(data, box_start, box_end):
+                if track_end > box_end:
+                    break
+                if track_kind == b"tkhd" and track_end - track_start >= 8:
+                    track_width, track_height = struct.unpack(
+                        ">II", data[track_end - 8 : track_end]
+                    )
+                    if track_width and track_height:
+                        width, height = track_width >> 16, track_height >> 16
+    return media._replace(width=width, height=height, duration=duration)
+
+
+PROBES = (
+    (b"\x89PNG\r\n\x1a\n", probe_png),
+    (b"\xff\xd8", probe_jpeg),
+    (b"GIF87a", probe_gif),
+    (b"GIF89a", probe_gif),
+    (b"RIFF", probe_webp),
+)
@@ -7,8 +7,28 @@ import urllib.parse
 import bs4
 import requests
 
+import deadline
+from cache import TTLCache
 from common import shorten
-from regexes import ircspecial
+from dispatch import command
+from singleflight import SingleFlight
+
+
+def check_status(response):
+    """
+    check_status raises HTTPError unless a response is a 200, DuckDuckGo
+    answers 202 to the requests it throttles.
+
+    Args:
+        response (requests.Response): the response
+
+    Raises:
+        requests.exceptions.HTTPError if the status is not 200.
+    """
+    if response.status_code != 200:
+        raise requests.exceptions.HTTPError(
+            f"{response.status_code} from {response.url}", response=response
+        )
 
 
 class DuckDuckGo:
@@ -17,11 +37,43 @@ class DuckDuckGo:
     and returning the first result.
     """
 
-    def __init__(self):
+    def __init__(self, http, cache=None, cache_ttl=6 * 60 * 60):
         """
         __init__ initializes the DuckDuckGo class.
+
+        Args:
+            http (HTTPClient): the HTTP client to use
+            cache (TTLCache): the cache for the results, by query
+            cache_ttl (float): how long results are cached
+        """
+        self.http = http
+        self.flight = SingleFlight()
+        self.cache = cache if cache is not None else TTLCache()
+        self.cache_ttl = cache_ttl
+
+    def search(self, query):
         """
-        self.session = requests.Session()
+        search returns the first result from a duckduckgo search and caches
+        it, unless the search failed.
+
+        Args:
+            query (str): the query to be searched
+
+        Returns:
+            str: the first result from the search
+        """
+        try:
+            result = self._duckduckgo(query)
+        except (
+            requests.exceptions.RequestException,
+            deadline.DeadlineExceeded,
+            ValueError,
+        ) as e:
+            # Not cached, the next search may work.
+            print(f"Could not search for {query}: {e!r}")
+            return "No results found."
+        self.cache.set(query, result, self.cache_ttl)
+        return result
 
     def _duckduckgo(self, query):
         """
@@ -30,11 +82,18 @@ class DuckDuckGo:
         Args:
             query (str): the query to be searched
 
+        Raises:
+            requests.exceptions.RequestException if a request failed or was
+            not answered with a 200.
+            DeadlineExceeded if the deadline passed.
+            ValueError if the answer of the API is not JSON.
+
         Returns:
             str: the first result from the search
         """
         url = f"https://api.duckduckgo.com/?q={urllib.parse.quote_plus(query)}&format=json&pretty=1"
-        response = self.session.get(url)
+        response = self.http.get(url)
+        check_status(response)
         data = response.json()
         try:
             result = data["AbstractText"]
@@ -51,12 +110,14 @@ class DuckDuckGo:
             except (KeyError, Exception):
                 try:
                     url = f"https://html.duckduckgo.com/html/?q={urllib.parse.quote_plus(query)}"
-                    response = self.session.get(
+                    response = self.http.get(
                         url,
                         headers={
                             "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/51.0.2704.103 Safari/537.36"
                         },
                     )
+                    # Rate limits and errors are not an absence of results.
+                    check_status(response)
                     data = response.text
                     soup = bs4.BeautifulSoup(data, "html.parser")
                     result = soup.find("div", id="links").find(
@@ -68,27 +129,31 @@ class DuckDuckGo:
                     if not snippet:
                         raise Exception
                     return shorten(snippet, 500)
+                except (
+                    requests.exceptions.RequestException,
+                    deadline.DeadlineExceeded,
+                ):
+                    raise
                 except Exception:
                     return "No results found."
 
-    def duckduckgo(self, nick, source, privmsg, netmask, is_channel, send_message):
+    @command(".ddg")
+    def duckduckgo(self, ctx, send_message):
         """
         duckduckgo searches DuckDuckGo for the text it receives.
 
         Args:
-            nick (str): the nick of the user who sent the message
-            source (str): the channel or nick the message came from
-            privmsg (str): the message
-            netmask (str): the netmask of the user who sent the message
-            is_channel (bool): whether or not the message was sent in a channel
+            ctx (MessageContext): the message
             send_message (function): a function used to send a message to the correct location
 
         Returns:
             None if duckduckgo was not used, True if it was used
         """
         ret = None
-        if privmsg.startswith(".ddg "):
-            query = ircspecial.sub("", privmsg[len(".ddg ") :])
-            send_message(f"{self._duckduckgo(query)}", source)
+        if ctx.privmsg.startswith(".ddg "):
+            result = self.cache.get(ctx.args)
+            if result is None:
+                result = self.flight.do(ctx.args, self.search, ctx.args)
+            send_message(f"{result}", ctx.source)
             ret = True
         return ret
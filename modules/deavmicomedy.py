@@ -2,7 +2,7 @@
 DeavmiComedy is a module for botty that turns boring text into funny text.
 """
 
-from regexes import ircspecial
+from dispatch import command
 
 
 def _deavmicomedy(text):
@@ -21,25 +21,21 @@ def _deavmicomedy(text):
     return haha[:-1]
 
 
-def deavmicomedy(nick, source, privmsg, netmask, is_channel, send_message):
+@command(".deavmicomedy")
+def deavmicomedy(ctx, send_message):
     """
     deavmicomedy turns the text it receives into something of comedic value
     for deavmi.
 
     Args:
-        nick (str): the nick of the user who sent the message
-        source (str): the channel or nick the message came from
-        privmsg (str): the message
-        netmask (str): the netmask of the user who sent the message
-        is_channel (bool): whether or not the message was sent in a channel
+        ctx (MessageContext): the message
         send_message (function): a function used to send a message to the correct location
 
     Returns:
         None if deavmicomedy was not used, True if it was used
     """
     ret = None
-    if privmsg.startswith(".deavmicomedy "):
-        to_be_funnied = ircspecial.sub("", privmsg[len(".deavmicomedy ") :])
-        send_message(f"{_deavmicomedy(to_be_funnied)}", source)
+    if ctx.privmsg.startswith(".deavmicomedy "):
+        send_message(f"{_deavmicomedy(ctx.args)}", ctx.source)
         ret = True
     return ret
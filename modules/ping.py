@@ -4,25 +4,34 @@ ping module for botty
 
 import subprocess
 
+import deadline
+from dispatch import command
 
-def ping(nick, source, privmsg, netmask, is_channel, send_message):
+
+@command(".ping")
+def ping(ctx, send_message):
     """
     ping does a ping to the address provided
     """
     ret = None
-    if privmsg.startswith(".ping "):
+    if ctx.privmsg.startswith(".ping "):
         ret = True
-        cmd = privmsg[len(".ping ") :]
-        cmd = cmd.split(" ")[0]
+        cmd = ctx.args.split(" ")[0]
         if cmd.startswith("-"):
             return ret
 
-        process = subprocess.run(
-            ["ping", "-c", "4", "-i", "0.2", cmd],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-        )
+        try:
+            # ping is killed if it is still running at the deadline.
+            process = subprocess.run(
+                ["ping", "-c", "4", "-i", "0.2", cmd],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                timeout=deadline.remaining(),
+            )
+        except subprocess.TimeoutExpired:
+            send_message("Timed out.", ctx.source)
+            return ret
 
         if process.returncode == 0:
             for line in process.stdout.split("\n"):
@@ -36,6 +45,6 @@ def ping(nick, source, privmsg, netmask, is_channel, send_message):
                         msg = line.strip()
 
         if msg.strip() != "":
-            send_message(f"{msg}", source)
+            send_message(f"{msg}", ctx.source)
 
     return ret
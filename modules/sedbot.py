@@ -5,7 +5,7 @@ sedbot module for botty.
 import re
 
 from common import shorten
-from regexes import ircspecial
+from dispatch import passive
 
 
 def a_poor_mans_sed_implementation(text, sed_pattern):
@@ -105,42 +105,39 @@ class SedBot:
         """
         self.messages = {}
 
-    def sed(self, nick, source, privmsg, netmask, is_channel, send_message):
+    @passive(lambda ctx: ctx.is_channel)
+    def sed(self, ctx, send_message):
         """
         Handles the sed command.
 
         Args:
-            nick (str): the nick of the user who sent the message
-            source (str): the channel or nick the message came from
-            privmsg (str): the message
-            netmask (str): the netmask of the user who sent the message
-            is_channel (bool): whether or not the message was sent in a channel
+            ctx (MessageContext): the message
             send_message (function): a function used to send a message to the correct location
 
         Returns:
             None if sed was not used, True if it was used
         """
-        if not is_channel:
+        if not ctx.is_channel:
             return None
 
-        _netmask = "!".join(netmask.split("!")[1:])
-        _privmsg = ircspecial.sub("", privmsg.strip())
-        if not privmsg.startswith("s/"):
+        _netmask = ctx.userhost
+        _privmsg = ctx.text.strip()
+        if not ctx.privmsg.startswith("s/"):
             try:
-                self.messages[source][_netmask] = _privmsg
+                self.messages[ctx.source][_netmask] = _privmsg
             except KeyError:
-                self.messages[source] = {}
-                self.messages[source][_netmask] = _privmsg
+                self.messages[ctx.source] = {}
+                self.messages[ctx.source][_netmask] = _privmsg
             return None
 
         try:
             sed_result = shorten(
                 a_poor_mans_sed_implementation(
-                    self.messages[source][_netmask], _privmsg
+                    self.messages[ctx.source][_netmask], _privmsg
                 ),
                 500,
             )
-            send_message(f"{sed_result}", source)
+            send_message(f"{sed_result}", ctx.source)
         except (KeyError, re.error):
             pass
 
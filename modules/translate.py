@@ -5,9 +5,8 @@ translate is a module for botty that translates text.
 import json
 import urllib.parse
 
-import requests
-
-from regexes import ircspecial
+from cache import TTLCache
+from dispatch import command
 
 
 class Translate:
@@ -15,15 +14,24 @@ class Translate:
     Translate is a class that translates text to the specified language
     """
 
-    def __init__(self):
+    def __init__(self, http, cache=None, cache_ttl=24 * 60 * 60):
         """
         __init__ is the constructor for Translate
+
+        Args:
+            http (HTTPClient): the HTTP client to use
+            cache (TTLCache): the cache for the translations, by language
+                and text
+            cache_ttl (float): how long translations are cached
         """
-        self.session = requests.Session()
+        self.http = http
+        self.cache = cache if cache is not None else TTLCache()
+        self.cache_ttl = cache_ttl
 
     def _translate(self, text, to_lang="en"):
         """
-        _translate translates text to the specified language
+        _translate translates text to the specified language, from the cache
+        if it was translated recently
 
         Args:
             text (str): text to translate
@@ -32,40 +40,37 @@ class Translate:
         Returns:
             str: translated text
         """
+        new_data = self.cache.get((to_lang, text))
+        if new_data is not None:
+            return new_data
         url = f"https://translate.google.com/translate_a/single?client=gtx&sl=auto&tl={urllib.parse.quote_plus(to_lang)}&dt=t&q={urllib.parse.quote_plus(text)}"
-        response = self.session.get(url)
+        response = self.http.get(url)
         data = json.loads(response.text)
         new_data = ""
         for iter_data in data[0]:
             new_data += f"{iter_data[0]}"
+        self.cache.set((to_lang, text), new_data, self.cache_ttl)
         return new_data
 
-    def translate(self, nick, source, privmsg, netmask, is_channel, send_message):
+    @command(".tr")
+    def translate(self, ctx, send_message):
         """
         mktranslate translates a message into a different language.
 
         Args:
-            nick (str): the nick of the user who sent the message
-            source (str): the channel or nick the message came from
-            privmsg (str): the message
-            netmask (str): the netmask of the user who sent the message
-            is_channel (bool): whether or not the message was sent in a channel
+            ctx (MessageContext): the message
             send_message (function): a function used to send a message to the correct location
 
         Returns:
             None if translate was not used, True if it was used
         """
         ret = None
-        if privmsg.startswith(".tr ") or privmsg.startswith(".tr:"):
-            if privmsg.startswith(".tr:"):
-                privmsg = privmsg[len(".tr") :]
-                privmsg = privmsg.split(" ")
-                tolang = privmsg[0][1:]
-                text_to_trans = ircspecial.sub("", " ".join(privmsg[1:]))
+        if ctx.privmsg.startswith(".tr ") or ctx.privmsg.startswith(".tr:"):
+            if ctx.option is not None:
+                tolang = ctx.option
             else:
-                text_to_trans = ircspecial.sub("", privmsg[len(".tr ") :])
                 tolang = "en"
-            transed = f"{self._translate(text_to_trans, tolang)}"
-            send_message(f"{transed}", source)
+            transed = f"{self._translate(ctx.args, tolang)}"
+            send_message(f"{transed}", ctx.source)
             ret = True
         return ret
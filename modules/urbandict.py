@@ -1,9 +1,9 @@
 import urllib.parse
 
-import requests
-
+from cache import TTLCache
 from common import shorten
-from regexes import ircspecial
+from dispatch import command
+from singleflight import SingleFlight
 
 
 class UrbanDictionary:
@@ -11,83 +11,67 @@ class UrbanDictionary:
     UrbanDictionary class for getting definitions from Urban Dictionary.
     """
 
-    def __init__(self):
+    def __init__(self, http, cache=None, cache_ttl=24 * 60 * 60):
         self.url = "http://api.urbandictionary.com/v0/define?term="
-        self.session = requests.Session()
+        self.http = http
+        self.flight = SingleFlight()
+        # Definitions by term and number, errors are not cached.
+        self.cache = cache if cache is not None else TTLCache()
+        self.cache_ttl = cache_ttl
 
     def get_definition(self, word, item=1):
         """
-        Get the definition of a word from Urban Dictionary.
+        Get the definition of a word from Urban Dictionary, and cache it
+        unless the request failed.
         """
         url = self.url + urllib.parse.quote_plus(word)
-        response = self.session.get(url)
-        item -= 1  # item starts at 0, so we need to subtract 1
-        if response.status_code == 200:
-            data = response.json()
-            if data["list"]:
-                try:
-                    return_data = []
-                    return_data.append(
-                        f"\x02Definition:\x02 {shorten(data['list'][item]['definition'], 140)}\n"
-                    )
-                    return_data.append(
-                        f"\x02Example:\x02 {shorten(data['list'][item]['example'], 140)}\n"
-                    )
-                    return_data.append(
-                        f"\x02Author:\x02 {data['list'][item]['author']}\n"
-                    )
-                    return_data.append(
-                        f"\x02Permalink:\x02 {data['list'][item]['permalink']}"
-                    )
-                    return return_data
-                except IndexError:
-                    return ["No definition found."]
-            else:
-                return ["No definition found."]
-        else:
+        response = self.http.get(url)
+        if response.status_code != 200:
             return ["Error: {}".format(response.status_code)]
+        data = response.json()
+        try:
+            definition = data["list"][item - 1]  # item starts at 1
+            return_data = [
+                f"\x02Definition:\x02 {shorten(definition['definition'], 140)}\n",
+                f"\x02Example:\x02 {shorten(definition['example'], 140)}\n",
+                f"\x02Author:\x02 {definition['author']}\n",
+                f"\x02Permalink:\x02 {definition['permalink']}",
+            ]
+        except IndexError:
+            return_data = ["No definition found."]
+        self.cache.set((word, item), return_data, self.cache_ttl)
+        return return_data
 
-    def mkurbandict(
-        self,
-        nick: str,
-        source: str,
-        privmsg: str,
-        netmask: str,
-        is_channel: bool,
-        send_message: callable,
-    ):
+    @command(".ub")
+    def mkurbandict(self, ctx, send_message: callable):
         """
         mkurbandict gets a definition from Urban Dictionary.
 
         Args:
-            nick (str): the nick of the user who sent the message
-            source (str): the channel or nick the message came from
-            privmsg (str): the message
-            netmask (str): the netmask of the user who sent the message
-            is_channel (bool): whether or not the message was sent in a channel
+            ctx (MessageContext): the message
             send_message (function): a function used to send a message to the correct location
 
         Returns:
             None if urbandict was not used, True if it was used
         """
-        if privmsg.startswith(".ub ") or privmsg.startswith(".ub:"):
-            if privmsg.startswith(".ub:"):
-                privmsg = privmsg[len(".ub") :]
-                privmsg = privmsg.split(" ")
+        if ctx.privmsg.startswith(".ub ") or ctx.privmsg.startswith(".ub:"):
+            if ctx.option is not None:
                 try:
-                    def_num = int(privmsg[0][1:])
+                    def_num = int(ctx.option)
                 except ValueError:
-                    send_message(f"Invalid definition number.", source)
+                    send_message(f"Invalid definition number.", ctx.source)
                     return True
-                query = ircspecial.sub("", " ".join(privmsg[1:]))
             else:
-                query = ircspecial.sub("", privmsg[len(".ub ") :])
                 def_num = 1
             if def_num <= 0:
-                send_message(f"Invalid definition number.", source)
+                send_message(f"Invalid definition number.", ctx.source)
                 return True
-            ub_list = self.get_definition(query, def_num)
+            ub_list = self.cache.get((ctx.args, def_num))
+            if ub_list is None:
+                ub_list = self.flight.do(
+                    (ctx.args, def_num), self.get_definition, ctx.args, def_num
+                )
             for ub_item in ub_list:
-                send_message(f"{ub_item}", source)
+                send_message(f"{ub_item}", ctx.source)
             return True
         return None
@@ -2,19 +2,84 @@
 urltitle is a module for botty that returns the title of a URL.
 """
 
+import concurrent.futures
 import json
+import threading
+import time
 import urllib.parse
 from datetime import datetime, timedelta
 
 import humanize
-import lxml.html
 import magic
 import requests
 import urllib3.exceptions
 
-from common import shorten
-from regexes import ircspecial, twregex, urlregex, ytregex
-from webpreview import web_preview
+import deadline
+import mediaprobe
+from backends import BackendPool
+from cache import TTLCache
+from common import normalize_url, shorten
+from dispatch import passive
+from outbound import BULK
+from regexes import ircspecial, twregex, ytregex
+from singleflight import SingleFlight
+from webpreview import read_head, web_preview
+
+# How long the messages for a URL are cached, by the start of its content
+# type, the first match is used. "youtube" is used for YouTube videos.
+CACHE_TTLS = {
+    "text/html": 30 * 60,
+    "application/xhtml+xml": 30 * 60,
+    # View counts and likes change, do not keep them for too long.
+    "youtube": 10 * 60,
+    # Images, videos, archives...
+    "": 6 * 60 * 60,
+}
+# How long a URL without a title, or that failed to load, is cached.
+NEGATIVE_TTL = 60
+# How long the destination of a redirect chain is cached, by the status of
+# the redirects. A chain is cached as long as its shortest lived redirect.
+REDIRECT_TTLS = {
+    301: 24 * 60 * 60,
+    308: 24 * 60 * 60,
+    302: 5 * 60,
+    303: 5 * 60,
+    307: 5 * 60,
+}
+# Invidious instances YouTube videos are looked up on, the fastest one up is
+# used.
+YOUTUBE_BACKENDS = ["https://invidious.snopyta.org"]
+# Return YouTube Dislike API, looked up at the same time.
+DISLIKE_API = "https://returnyoutubedislikeapi.com"
+# Paths whose start is requested with a Range header, as only the start of
+# images, videos and archives is read.
+BINARY_EXTENSIONS = (
+    ".7z",
+    ".avi",
+    ".bz2",
+    ".dmg",
+    ".exe",
+    ".gif",
+    ".gz",
+    ".img",
+    ".iso",
+    ".jpeg",
+    ".jpg",
+    ".m4a",
+    ".m4v",
+    ".mkv",
+    ".mov",
+    ".mp3",
+    ".mp4",
+    ".png",
+    ".rar",
+    ".tar",
+    ".webm",
+    ".webp",
+    ".xz",
+    ".zip",
+    ".zst",
+)
 
 
 class UrlTitle:
@@ -22,19 +87,82 @@ class UrlTitle:
     UrlTitle is a class that provides methods for getting the title of a URL.
     """
 
-    def __init__(self):
-        self.session = requests.Session()
-        headers = {
+    def __init__(
+        self,
+        http,
+        cache=None,
+        cache_ttls=CACHE_TTLS,
+        negative_ttl=NEGATIVE_TTL,
+        workers=8,
+        concurrency=3,
+        link_timeout=10,
+        max_bytes=65536,
+        probe_bytes=16384,
+        youtube_backends=YOUTUBE_BACKENDS,
+        video_cache=None,
+        redirect_cache=None,
+        redirect_ttls=REDIRECT_TTLS,
+    ):
+        """
+        __init__ is the constructor for UrlTitle.
+
+        Args:
+            http (HTTPClient): the HTTP client to use
+            cache (TTLCache): the cache for the messages of the URLs
+            cache_ttls (dict): how long messages are cached by content type
+            negative_ttl (float): how long URLs without a title are cached
+            workers (int): the threads fetching URLs, shared by all messages
+            concurrency (int): the URLs of one message fetched at the same time
+            link_timeout (float): seconds after which a URL is skipped, None
+                to only use the deadline of the module
+            max_bytes (int): the most bytes read from an HTML page
+            probe_bytes (int): the most bytes read from other URLs
+            youtube_backends (list): the Invidious instances to use
+            video_cache (TTLCache): the cache for the info of YouTube videos,
+                by video id, kept as long as cache_ttls["youtube"]
+            redirect_cache (TTLCache): the cache for the destinations of
+                redirected URLs, by the URL as posted
+            redirect_ttls (dict): how long destinations are cached by the
+                status of the redirects
+        """
+        self.http = http
+        self.pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="urltitle"
+        )
+        # Lookups made alongside the ones of the pool, which may all be
+        # waiting on them.
+        self.lookups = concurrent.futures.ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="urltitle-lookup"
+        )
+        self.youtube = BackendPool(youtube_backends)
+        self.videos = video_cache if video_cache is not None else TTLCache()
+        self.redirects = redirect_cache if redirect_cache is not None else TTLCache()
+        self.redirect_ttls = redirect_ttls
+        self.concurrency = concurrency
+        self.link_timeout = link_timeout
+        self.max_bytes = max_bytes
+        self.probe_bytes = probe_bytes
+        self.magic = magic.Magic()
+        self.magic_lock = threading.Lock()
+        self.lock = threading.Lock()
+        self.fetches = 0
+        self.bytes_read = 0
+        self.cache = cache if cache is not None else TTLCache()
+        self.cache_ttls = cache_ttls
+        self.negative_ttl = negative_ttl
+        # Links posted in several channels at once are only fetched once.
+        self.flight = SingleFlight()
+        self.headers = {
             "User-Agent": "Mozilla/5.0 (X11; Linux x86_64; rv:95.0) Gecko/20100101 Firefox/95.0",
             "Accept": "text/html,application/xhtml+xml,*/*",
             "Accept-Language": "en-US,en;q=0.5",
         }
-        self.session.headers.update(headers)
 
     def ytoutput(self, video_id):
         """
-        ytoutput gets the title, description, and other info of a youtube video
-        and displays it in a nice IRC friendly format.
+        ytoutput gets the info of a youtube video, from the cache if it was
+        looked up recently, sharing the lookup with other threads looking up
+        the same video.
 
         Args:
             video_id (str): the video id of the video to get info for
@@ -42,21 +170,63 @@ class UrlTitle:
         Returns:
             str: the formatted info
         """
-        response = self.session.get(
-            f"https://invidious.snopyta.org/api/v1/videos/{video_id}",
-        )
-        response2 = self.session.get(
-            f"https://returnyoutubedislikeapi.com/Votes?videoId={video_id}",
-            headers={
-                "User-Agent": "Mozilla/5.0 (X11; Linux x86_64; rv:95.0) Gecko/20100101 Firefox/95.0"
-            },
+        msg = self.videos.get(video_id)
+        if msg is None:
+            msg = self.flight.do(("youtube", video_id), self._ytoutput, video_id)
+            self.videos.set(video_id, msg, self.cache_ttls["youtube"])
+        return msg
+
+    def dislikes(self, expires, video_id):
+        """
+        dislikes gets the votes of a youtube video from the dislike API, in a
+        thread of self.lookups.
+
+        Args:
+            expires (float): the time.monotonic() of the deadline of the
+                caller, None for no deadline
+            video_id (str): the video id of the video to get votes for
+
+        Returns:
+            dict: the votes, None if they could not be found
+        """
+        seconds = None if expires is None else expires - time.monotonic()
+        with deadline.budget(seconds):
+            try:
+                response = self.http.get(
+                    f"{DISLIKE_API}/Votes?videoId={video_id}",
+                    headers=self.headers,
+                )
+                response.raise_for_status()
+                return json.loads(response.content)
+            except (requests.exceptions.RequestException, ValueError) as e:
+                print(f"Could not get the votes of {video_id}: {e}")
+                return None
+
+    def _ytoutput(self, video_id):
+        """
+        _ytoutput gets the title, description, and other info of a youtube video
+        and displays it in a nice IRC friendly format. The video and its votes
+        are looked up at the same time, the votes are left out if they could
+        not be found.
+
+        Args:
+            video_id (str): the video id of the video to get info for
+
+        Returns:
+            str: the formatted info
+        """
+        seconds = deadline.remaining()
+        expires = None if seconds is None else time.monotonic() + seconds
+        votes = self.lookups.submit(self.dislikes, expires, video_id)
+        response = self.youtube.get(
+            self.http, f"/api/v1/videos/{video_id}", headers=self.headers
         )
         json_load = json.loads(response.content)
         title = json_load["title"]
         length = json_load["lengthSeconds"]
         upvote = json_load["likeCount"]
-        json_load2 = json.loads(response2.content)
-        downvote = json_load2["dislikes"]
+        json_load2 = votes.result()
+        downvote = json_load2["dislikes"] if json_load2 else 0
         try:
             ratio = f"{(upvote/(downvote+upvote) * 100):.1f}%"
         except ZeroDivisionError:
@@ -78,141 +248,424 @@ class UrlTitle:
         msg = f"{msg}\x03\x0F views - \x02{channel_name}\x03\x0F on \x02{date_uploaded}\x03\x0F - {yt_shortlink}"
         return msg
 
-    def urltitle(self, nick, source, privmsg, netmask, is_channel, send_message):
+    @passive(lambda ctx: "://" in ctx.privmsg)
+    def urltitle(self, ctx, send_message):
         """
         urltitle gets the title of a URL and displays it in a nice IRC friendly format.
 
         Args:
-            nick (str): the nick of the user who sent the message
-            source (str): the channel or nick the message came from
-            privmsg (str): the message
-            netmask (str): the netmask of the user who sent the message
-            is_channel (bool): whether or not the message was sent in a channel
+            ctx (MessageContext): the message
             send_message (function): a function used to send a message to the correct location
 
         Returns:
             None if urltitle was not used, True if it was used
         """
         ret = None
-        bypass = False
-        for iterations, url_irc in enumerate(
-            urlregex.findall(ircspecial.sub("", privmsg))
-        ):
-            if iterations > 2:
-                continue
-            url_irc = url_irc[0]
-            url_with_http = (
-                url_irc
-                if url_irc.startswith("http://") or url_irc.startswith("https://")
-                else "http://" + url_irc
+        urls = ctx.urls[:3]
+        seconds = deadline.remaining(self.link_timeout)
+        if seconds is not None and self.link_timeout is not None:
+            seconds = min(seconds, self.link_timeout)
+        expires = None if seconds is None else time.monotonic() + seconds
+
+        # The URLs are fetched concurrently, at most self.concurrency at a
+        # time, but the titles are sent in the order the URLs were posted.
+        futures = []
+
+        def submit():
+            futures.append(
+                self.pool.submit(self.title_until, expires, urls[len(futures)])
             )
+
+        while len(futures) < min(self.concurrency, len(urls)):
+            submit()
+        for i, url_irc in enumerate(urls):
+            timeout = None if expires is None else max(0.0, expires - time.monotonic())
             try:
-                response = self.session.head(
-                    url_with_http,
-                    allow_redirects=True,
+                finalmsg = futures[i].result(timeout)
+            except (concurrent.futures.TimeoutError, deadline.DeadlineExceeded):
+                print(f"Skipped the title of {url_irc}, it took too long")
+                finalmsg = []
+            if len(futures) < len(urls):
+                submit()
+            for msg in finalmsg:
+                send_message(msg, ctx.source, lane=BULK)
+                ret = True
+        return ret
+
+    def title_until(self, expires, url_irc):
+        """
+        title_until runs title in a thread of the pool with a deadline.
+
+        Args:
+            expires (float): the time.monotonic() the title must be found by,
+                None for no deadline
+            url_irc (str): the URL as it was posted
+
+        Returns:
+            list: the messages, empty if there is nothing to say about the URL
+        """
+        seconds = None if expires is None else expires - time.monotonic()
+        with deadline.budget(seconds):
+            return self.title(url_irc)
+
+    def title(self, url_irc):
+        """
+        title gets the messages to send for a URL, from the cache if the URL
+        or the URL it redirected to was looked up recently, without making
+        any request. Threads looking up the same URL at the same time share
+        a single request.
+
+        Args:
+            url_irc (str): the URL as it was posted
+
+        Returns:
+            list: the messages, empty if there is nothing to say about the URL
+        """
+        url_with_http = (
+            url_irc
+            if url_irc.startswith("http://") or url_irc.startswith("https://")
+            else "http://" + url_irc
+        )
+        try:
+            source = normalize_url(url_with_http)
+        except ValueError:
+            return []
+        finalmsg = self.cache.get(source)
+        if finalmsg is not None:
+            return finalmsg
+        destination = self.redirects.get(source)
+        if destination is not None:
+            finalmsg = self.cache.get(normalize_url(destination))
+            if finalmsg is not None:
+                return finalmsg
+        return self.flight.do(
+            ("url", source), self.fetch, source, destination or url_with_http
+        )
+
+    def fetch(self, source, url):
+        """
+        fetch gets the messages to send for a URL with a single streaming
+        GET, and caches where it redirected to. A URL that fails to load is
+        cached as having nothing to say for negative_ttl.
+
+        Args:
+            source (str): the cache key of the URL as posted
+            url (str): the URL to request, the destination of source if it
+                is known
+
+        Returns:
+            list: the messages, empty if there is nothing to say about the URL
+        """
+        headers = self.headers
+        path = urllib.parse.urlsplit(url).path.lower()
+        if path.endswith(BINARY_EXTENSIONS):
+            # Ask for the start of files only, servers may ignore it.
+            headers = {**headers, "Range": f"bytes=0-{self.probe_bytes - 1}"}
+        try:
+            response = self.http.get(
+                url,
+                allow_redirects=True,
+                stream=True,
+                headers=headers,
+            )
+        except (
+            requests.exceptions.RequestException,
+            urllib3.exceptions.LocationParseError,
+        ):
+            # Reposts of a dead link do not wait for it again.
+            self.cache.set(source, [], self.negative_ttl)
+            return []
+
+        try:
+            if normalize_url(url) == source:
+                self.cache_redirects(source, response)
+            key = normalize_url(response.url)
+            finalmsg = self.cache.get(key)
+            if finalmsg is None:
+                # Different URLs posted at the same time may lead to the
+                # same page.
+                finalmsg = self.flight.do(
+                    ("page", key), self.fetch_and_cache, key, response
                 )
-            except requests.exceptions.RequestException:
-                continue
-            except urllib3.exceptions.LocationParseError:
+        finally:
+            response.close()
+        return finalmsg
+
+    def cache_redirects(self, source, response):
+        """
+        cache_redirects caches where a URL redirected to, for as long as
+        the shortest lived redirect of the chain allows.
+
+        Args:
+            source (str): the cache key of the URL as posted
+            response (requests.Response): the response of the URL, after its
+                redirects
+        """
+        if not response.history:
+            return
+        ttl = min(
+            self.redirect_ttls.get(redirect.status_code, 0)
+            for redirect in response.history
+        )
+        if ttl > 0:
+            self.redirects.set(source, response.url, ttl)
+
+    def fetch_and_cache(self, key, response):
+        """
+        fetch_and_cache gets the title of a URL and caches it.
+
+        Args:
+            key (str): the cache key of the URL
+            response (requests.Response): the streamed response of the URL
+
+        Returns:
+            list: the messages, empty if there is nothing to say about the URL
+        """
+        finalmsg, content_type = self.fetch_title(response)
+        self.cache.set(key, finalmsg, self.cache_ttl(finalmsg, content_type))
+        return finalmsg
+
+    def report(self):
+        """
+        report returns the statistics of the title cache, of the coalesced
+        lookups, of the bytes read from URLs and of YouTube lookups.
+
+        Returns:
+            dict: the entries, bytes, hits, misses, hit ratio and evictions
+            of the cache, the executed and coalesced lookups, the URLs read
+            with the bytes read from them, the statistics of the video and
+            redirect caches under "videos" and "redirects" and the Invidious
+            instances under "youtube"
+        """
+        with self.lock:
+            fetches = {"fetches": self.fetches, "bytes_read": self.bytes_read}
+        return {
+            **self.cache.report(),
+            **self.flight.report(),
+            **fetches,
+            "videos": self.videos.report(),
+            "redirects": self.redirects.report(),
+            "youtube": self.youtube.report(),
+        }
+
+    def cache_ttl(self, finalmsg, content_type):
+        """
+        cache_ttl returns how long the messages for a URL are cached.
+
+        Args:
+            finalmsg (list): the messages
+            content_type (str): the content type of the URL, "youtube" for videos
+
+        Returns:
+            float: the time to live in seconds
+        """
+        if not finalmsg:
+            return self.negative_ttl
+        for prefix, ttl in self.cache_ttls.items():
+            if content_type.startswith(prefix):
+                return ttl
+        return self.negative_ttl
+
+    def probe(self, response):
+        """
+        probe reads the start of a response that is not HTML, only as much
+        as needed to identify images and videos and at most probe_bytes.
+
+        Args:
+            response (requests.Response): the streamed response
+
+        Returns:
+            tuple: the bytes read and the Media, None if it is not an image
+            or video mediaprobe knows
+        """
+        content = b""
+        for chunk in response.iter_content(chunk_size=4096, decode_unicode=False):
+            content = (content + chunk)[: self.probe_bytes]
+            try:
+                return content, mediaprobe.probe(
+                    content, final=len(content) >= self.probe_bytes
+                )
+            except mediaprobe.NeedMore:
                 continue
-            url = response.url
+        return content, mediaprobe.probe(content, final=True)
+
+    def describe_media(self, media):
+        """
+        describe_media describes an image or a video.
+
+        Args:
+            media (Media): the media
+
+        Returns:
+            str: its format, dimensions and duration
+        """
+        description = media.format
+        if media.width:
+            description += f", {media.width} x {media.height}"
+        if media.duration:
+            description += ", " + humanize.precisedelta(int(media.duration))
+        return description
+
+    def describe_bytes(self, content, content_type):
+        """
+        describe_bytes describes a file from its first bytes with libmagic.
+
+        Args:
+            content (bytes): the first bytes
+            content_type (str): the content type of the response
+
+        Returns:
+            str: the description
+        """
+        # A libmagic handle can not be used by two threads at once.
+        with self.magic_lock:
+            description = self.magic.from_buffer(content)
+        # libmagic may need more than the first bytes, the server knows better.
+        if description == "data" and content_type:
+            description = content_type.split(";")[0]
+        return description
+
+    def video_id(self, response):
+        """
+        video_id finds the id of the YouTube video a response was redirected
+        to, including through the consent page.
+
+        Args:
+            response (requests.Response): the response
+
+        Returns:
+            str: the video id, None if there is none
+        """
+        urls = [redirect.url for redirect in response.history] + [response.url]
+        for url in reversed(urls):
             parsed_url = urllib.parse.urlparse(url)
-            if ytregex.search(parsed_url.netloc):
-                try:
-                    parsed_url = urllib.parse.urlparse(
-                        "".join(urllib.parse.parse_qs(parsed_url.query)["continue"])
-                    )
-                except KeyError:
-                    pass
+            if not ytregex.search(parsed_url.netloc):
+                continue
+            query = urllib.parse.parse_qs(parsed_url.query)
+            if "continue" in query:
+                query = urllib.parse.parse_qs(
+                    urllib.parse.urlparse("".join(query["continue"])).query
+                )
+            if "v" in query:
+                return query["v"][0]
+        return None
 
+    def rewrite(self, url):
+        """
+        rewrite gets a URL rewritten to a front-end, unless the front-end is
+        down.
+
+        Args:
+            url (str): the URL on the front-end
+
+        Returns:
+            requests.Response: the streamed response, None if the original
+            URL should be used instead
+        """
+        if not self.http.available(url):
+            print(f"Not rewriting to {url}, the front-end is down")
+            return None
+        try:
+            response = self.http.get(
+                url,
+                allow_redirects=True,
+                stream=True,
+                headers=self.headers,
+            )
+        except requests.exceptions.RequestException as e:
+            print(f"Not rewriting to {url}: {e}")
+            return None
+        if response.status_code >= 500:
+            response.close()
+            return None
+        return response
+
+    def fetch_title(self, response):
+        """
+        fetch_title gets the title of a URL from the response of a GET that
+        followed its redirects. The URL is only requested again when its
+        host is rewritten to a front-end, the original response is used if
+        the front-end is down.
+
+        Args:
+            response (requests.Response): the streamed response
+
+        Returns:
+            tuple: the messages to send and the content type of the URL
+        """
+        parsed_url = urllib.parse.urlparse(response.url)
+        rewritten_url = None
+        if ytregex.search(parsed_url.netloc):
+            video_id = self.video_id(response)
+            if video_id is not None:
                 try:
-                    finalmsg = [
-                        self.ytoutput(urllib.parse.parse_qs(parsed_url.query)["v"][0])
-                    ]
-                    bypass = True
-                except KeyError:
-                    parsed_url = parsed_url._replace(netloc="yewtu.be")
-            elif twregex.search(parsed_url.netloc):
-                parsed_url = parsed_url._replace(netloc="nitter.fdn.fr")
-            if not bypass:
-                url_new = urllib.parse.urlunparse(parsed_url)
-                try:
-                    response = self.session.get(
-                        url_new,
-                        allow_redirects=True,
-                        stream=True,
-                    )
-                except requests.exceptions.RequestException:
-                    continue
-                if response.status_code >= 400:
-                    continue
-                # Read first 65536 bytes of the response which should be enough to get the title
-                # and the first few lines of the body.
-                for i in response.iter_content(chunk_size=65536, decode_unicode=False):
-                    content = i
-                    break
-                length = ""
-                try:
-                    if response.headers["Content-Length"]:
-                        length = (
-                            " ("
-                            + humanize.naturalsize(response.headers["Content-Length"])
-                            + ")"
-                        )
-                except KeyError:
-                    pass
-                # Default HTML encoding should be ISO-8859-1
-                encoding = "ISO-8859-1"
-                if response.encoding:
-                    encoding = response.encoding
+                    finalmsg = [self.ytoutput(video_id)]
+                except (
+                    requests.exceptions.RequestException,
+                    KeyError,
+                    ValueError,
+                ) as e:
+                    # Fall back to the title of the page on the front-end.
+                    print(f"Could not look up the video {video_id}: {e!r}")
                 else:
-                    try:
-                        # If HTML content-type is set to text/html, parse with lxml to get encoding
-                        if " ".join(response.headers["Content-Type"])[0] == "text/html":
-                            try:
-                                # Get from meta charset=
-                                encoding = (
-                                    lxml.html.fromstring(content)
-                                    .xpath("//meta[@charset]")[0]
-                                    .attrib["charset"]
-                                )
-                            except IndexError:
-                                try:
-                                    # Get from meta content-type
-                                    encoding = (
-                                        lxml.html.fromstring(content)
-                                        .xpath("//meta[@http-equiv='Content-Type']")[0]
-                                        .attrib["content"]
-                                        .split(";")[1]
-                                        .split("=")[1]
-                                    )
-                                except IndexError:
-                                    pass
-                    except KeyError:
-                        pass
+                    response.close()
+                    return finalmsg, "youtube"
+            rewritten_url = parsed_url._replace(netloc="yewtu.be")
+        elif twregex.search(parsed_url.netloc):
+            rewritten_url = parsed_url._replace(netloc="nitter.fdn.fr")
 
-                try:
-                    title, description, image = web_preview(
-                        url_new, content=content.decode(encoding), parser="lxml"
-                    )
-                    # title = title + length
-                except LookupError:
-                    title, description, image = None, None, None
-
-                if title is None:
-                    title, description, image = [
-                        magic.Magic().from_buffer(content) + length,
-                        None,
-                        None,
-                    ]
-
-                if isinstance(title, str):
-                    title = shorten(title, 500)
-                    title = f'[ \x0303{parsed_url.netloc}\x03\x0F ] \x02{ircspecial.sub("", " ".join(title.split()))}'
-                    finalmsg = [title]  # , description ]
+        if rewritten_url is not None:
+            rewritten = self.rewrite(urllib.parse.urlunparse(rewritten_url))
+            if rewritten is not None:
+                response.close()
+                response = rewritten
+                parsed_url = rewritten_url
+        url_new = urllib.parse.urlunparse(parsed_url)
+        content_type = response.headers.get("Content-Type", "")
+        if response.status_code >= 400:
+            response.close()
+            return [], content_type
+        media = None
+        if not content_type or "html" in content_type:
+            # The title is almost always in the head, stop reading there.
+            reader = read_head(
+                response.iter_content(chunk_size=4096, decode_unicode=False),
+                self.max_bytes,
+                content_type,
+            )
+            content = reader.content
+        else:
+            content, media = self.probe(response)
+        # Do not download the rest of the body.
+        response.close()
+        with self.lock:
+            self.fetches += 1
+            self.bytes_read += len(content)
+        print(f"Read {len(content)} bytes of {url_new}")
+        length = ""
+        size = response.headers.get("Content-Length")
+        if response.status_code == 206:
+            # Content-Range: bytes 0-16383/2147483648
+            size = response.headers.get("Content-Range", "").rpartition("/")[2]
+        if size and size.isdigit():
+            length = " (" + humanize.naturalsize(size) + ")"
 
-            if finalmsg is not None:
-                for msg in finalmsg:
-                    send_message(msg, source)
-                    ret = True
-        return ret
+        title = None
+        if media is not None:
+            title = self.describe_media(media) + length
+        elif not content_type or "html" in content_type:
+            try:
+                title, description, image = web_preview(
+                    url_new, content=reader.text, backend="lxml"
+                )
+                # title = title + length
+            except LookupError:
+                pass
+        if title is None:
+            title = self.describe_bytes(content, content_type) + length
+
+        if not isinstance(title, str):
+            return [], content_type
+        title = shorten(title, 500)
+        title = f'[ \x0303{parsed_url.netloc}\x03\x0F ] \x02{ircspecial.sub("", " ".join(title.split()))}'
+        return [title], content_type  # , description ]
@@ -0,0 +1,191 @@
+"""
+Outbound traffic handling for the IRC client.
+"""
+
+import asyncio
+import collections
+import time
+
+# Lanes of outbound traffic, lower lanes are always sent first.
+PROTOCOL = 0  # PONG, registration, NickServ, JOIN...
+INTERACTIVE = 1  # replies to commands
+BULK = 2  # background modules and URL titles
+LANES = (PROTOCOL, INTERACTIVE, BULK)
+
+
+class TokenBucket:
+    """
+    TokenBucket is a simple token bucket used for flood control, every line
+    sent costs one token.
+    """
+
+    def __init__(self, rate, burst):
+        """
+        __init__ is the constructor for the TokenBucket class.
+
+        Args:
+            rate (float): the amount of tokens added per second.
+            burst (int): the maximum amount of tokens the bucket can hold.
+        """
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def refill(self):
+        """
+        refill adds the tokens earned since the last refill.
+        """
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available(self):
+        """
+        available returns the amount of whole tokens in the bucket.
+        """
+        self.refill()
+        return int(self.tokens)
+
+    def take(self, amount=1):
+        """
+        take removes tokens from the bucket.
+        """
+        self.tokens -= amount
+
+    def delay(self, amount=1):
+        """
+        delay returns how long to wait until amount tokens are available.
+        """
+        self.refill()
+        return max(0.0, (amount - self.tokens) / self.rate)
+
+
+class OutboundQueue:
+    """
+    OutboundQueue is the single writer of an IRC connection. Lines are
+    queued from the event loop and written by one task, coalescing as many
+    queued lines into one write as the token bucket allows.
+
+    Every lane is emptied before the next one is looked at. Inside a lane
+    the targets take turns, one line each, so a long reply to one channel
+    does not hold back the others.
+    """
+
+    def __init__(self, writer, rate, burst):
+        """
+        __init__ is the constructor for the OutboundQueue class.
+
+        Args:
+            writer (asyncio.StreamWriter): the connection to write to.
+            rate (float): the amount of lines that can be sent per second.
+            burst (int): the amount of lines that can be sent at once.
+        """
+        self.writer = writer
+        self.bucket = TokenBucket(rate, burst)
+        # Per lane, the queued lines of every target in turn order.
+        self.lanes = [collections.OrderedDict() for _ in LANES]
+        self.depth = 0
+        self.wakeup = asyncio.Event()
+        self.sent = 0
+        self.max_depth = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def put(self, data, lane=PROTOCOL, target=None):
+        """
+        put queues a line to be sent, it must be called from the event loop.
+
+        Args:
+            data (bytes): the line, including the line ending.
+            lane (int): the lane to send the line in.
+            target (str): the channel or nick the line is for, if any.
+
+        Returns:
+            None
+        """
+        targets = self.lanes[lane]
+        try:
+            targets[target].append((data, time.monotonic()))
+        except KeyError:
+            targets[target] = collections.deque([(data, time.monotonic())])
+        self.depth += 1
+        self.max_depth = max(self.max_depth, self.depth)
+        self.wakeup.set()
+
+    def pop(self):
+        """
+        pop removes the next line to be sent from the queue.
+
+        Returns:
+            tuple: the line and the time it was queued at.
+        """
+        for targets in self.lanes:
+            if not targets:
+                continue
+            target, lines = next(iter(targets.items()))
+            line = lines.popleft()
+            if lines:
+                # Give the other targets of this lane a turn first.
+                targets.move_to_end(target)
+            else:
+                del targets[target]
+            self.depth -= 1
+            return line
+        raise IndexError("pop from an empty queue")
+
+    def stats(self):
+        """
+        stats returns the queue depth and wait time statistics.
+
+        Returns:
+            dict: the statistics.
+        """
+        return {
+            "depth": self.depth,
+            "lanes": [
+                sum(len(lines) for lines in targets.values()) for targets in self.lanes
+            ],
+            "max_depth": self.max_depth,
+            "sent": self.sent,
+            "average_wait": self.total_wait / self.sent if self.sent else 0.0,
+            "max_wait": self.max_wait,
+        }
+
+    async def run(self):
+        """
+        run writes queued lines to the connection until cancelled.
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        while True:
+            if not self.depth:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+            delay = self.bucket.delay()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+
+            batch = []
+            now = time.monotonic()
+            for _ in range(min(self.bucket.available(), self.depth)):
+                data, queued = self.pop()
+                batch.append(data)
+                self.total_wait += now - queued
+                self.max_wait = max(self.max_wait, now - queued)
+            self.bucket.take(len(batch))
+            self.sent += len(batch)
+            self.writer.write(b"".join(batch))
+            await self.writer.drain()
+
+            waited = now - queued
+            if waited >= 1:
+                print(
+                    f"Outbound queue: {self.depth} lines queued, last line waited {waited:.1f}s"
+                )
@@ -0,0 +1,96 @@
+"""
+Coalescing of identical calls made at the same time.
+
+When the same link is posted in several channels at once, every handler
+thread would otherwise fetch and parse the same page. SingleFlight lets
+the first caller for a key do the work while the others wait for its
+result.
+"""
+
+import threading
+
+import deadline
+
+
+class _Call:
+    """
+    _Call is a call in flight and, once done, its outcome.
+    """
+
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    SingleFlight runs at most one call per key at a time. Callers arriving
+    while a call for their key is in flight wait for it and share its
+    result, or its exception.
+    """
+
+    def __init__(self):
+        """
+        __init__ is the constructor for the SingleFlight class.
+        """
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key, function, *args):
+        """
+        do calls function with args, unless a call for key is already in
+        flight in which case its result is returned.
+
+        Args:
+            key: identifies the work, must be hashable.
+            function (function): the function doing the work.
+            *args: the arguments of function.
+
+        Raises:
+            DeadlineExceeded if the deadline of the thread passes while
+            waiting for another caller, and whatever function raised.
+
+        Returns:
+            the result of function.
+        """
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = _Call()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            if not call.done.wait(deadline.remaining()):
+                raise deadline.DeadlineExceeded(f"Gave up waiting for {key}.")
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = function(*args)
+            return call.result
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+                self.executed += 1
+            call.done.set()
+
+    def report(self):
+        """
+        report returns how many calls were made and how many were coalesced.
+
+        Returns:
+            dict: the executed and coalesced calls.
+        """
+        with self.lock:
+            return {"executed": self.executed, "coalesced": self.coalesced}
@@ -0,0 +1,937 @@
+import asyncio
+import random
+import sqlite3
+import struct
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import requests
+
+import httpclient
+import mediaprobe
+import outbound
+from cache import PersistentCache, TTLCache, sizeof
+from common import split_text_by_bytes
+from context import MessageContext
+from dispatch import legacy_module
+from ircproto import IRCMessage, LineFramer
+from modules.ddg import DuckDuckGo
+from modules.urltitle import UrlTitle
+from singleflight import SingleFlight
+from workers import BLOCK, WorkerPool
+
+
+class TestWorkerPool(unittest.TestCase):
+    """
+    Test WorkerPool.
+    """
+
+    def test_block_policy_runs_every_job(self):
+        """
+        Test that jobs submitted while waiting for room are run, even when
+        the drainer of their key finished in the meantime.
+        """
+        ran = []
+        lock = threading.Lock()
+
+        def job(key):
+            time.sleep(0.01)
+            with lock:
+                ran.append(key)
+
+        async def run():
+            pool = WorkerPool(2, queue_size=4, max_pending=2, policy=BLOCK)
+            for key in "abcabcdd":
+                await pool.submit(key, job, key)
+            while pool.drainers:
+                await asyncio.sleep(0.01)
+            pool.shutdown()
+            return pool
+
+        pool = asyncio.run(run())
+        self.assertEqual(sorted(ran), sorted("abcabcdd"))
+        self.assertEqual(pool.queues, {})
+        # Every permit was given back.
+        self.assertEqual(pool.pending._value, 2)
+
+
+def box(kind, content):
+    """
+    Build an ISO base media file box.
+    """
+    return struct.pack(">I4s", 8 + len(content), kind) + content
+
+
+def mp4(width=1920, height=1080, timescale=1000, length=125500, moov_first=True):
+    """
+    Build the start of an MP4 file.
+    """
+    mvhd = box(b"mvhd", b"\0" * 12 + struct.pack(">II", timescale, length) + b"\0" * 80)
+    tkhd = box(b"tkhd", b"\0" * 76 + struct.pack(">II", width << 16, height << 16))
+    ftyp = box(b"ftyp", b"isom\0\0\2\0isomiso2mp41")
+    moov = box(b"moov", mvhd + box(b"trak", tkhd))
+    mdat = box(b"mdat", b"\0" * 64)
+    return ftyp + (moov + mdat if moov_first else mdat + moov)
+
+
+PNG = b"\x89PNG\r\n\x1a\n" + struct.pack(
+    ">I4sIIBBBBB", 13, b"IHDR", 256, 128, 8, 6, 0, 0, 0
+)
+GIF = b"GIF89a" + struct.pack("<HH", 320, 200) + b"\0" * 8
+JPEG = (
+    b"\xff\xd8"
+    + b"\xff\xe0"
+    + struct.pack(">H", 16)
+    + b"JFIF\0"
+    + b"\0" * 9
+    + b"\xff\xc0"
+    + struct.pack(">HBHH", 17, 8, 480, 640)
+    + b"\0" * 10
+)
+WEBP_VP8X = b"RIFF\0\0\0\0WEBPVP8X" + b"\0" * 8 + (799).to_bytes(3, "little") * 2
+
+
+class TestMediaProbe(unittest.TestCase):
+    """
+    Test mediaprobe.
+    """
+
+    def test_formats(self):
+        """
+        Test the format and dimensions read from every supported format.
+        """
+        self.assertEqual(
+            mediaprobe.probe(PNG), mediaprobe.Media("PNG image", 256, 128, None)
+        )
+        self.assertEqual(
+            mediaprobe.probe(GIF), mediaprobe.Media("GIF image", 320, 200, None)
+        )
+        self.assertEqual(
+            mediaprobe.probe(JPEG), mediaprobe.Media("JPEG image", 640, 480, None)
+        )
+        self.assertEqual(
+            mediaprobe.probe(WEBP_VP8X),
+            mediaprobe.Media("WebP image", 800, 800, None),
+        )
+        self.assertEqual(
+            mediaprobe.probe(mp4()),
+            mediaprobe.Media("MP4 video", 1920, 1080, 125.5),
+        )
+
+    def test_unknown(self):
+        """
+        Test that other files are not identified.
+        """
+        self.assertIsNone(mediaprobe.probe(b"PK\x03\x04" + b"\0" * 64))
+        self.assertIsNone(mediaprobe.probe(b""))
+
+    def test_moov_at_the_end(self):
+        """
+        Test that MP4 videos whose moov box is at the end only get a format.
+        """
+        self.assertEqual(
+            mediaprobe.probe(mp4(moov_first=False)),
+            mediaprobe.Media("MP4 video", None, None, None),
+        )
+
+    def test_truncated(self):
+        """
+        Test that truncated headers ask for more data, or give what was
+        found when there is no more.
+        """
+        for data, media in (
+            (PNG[:20], mediaprobe.Media("PNG image", None, None, None)),
+            (GIF[:8], mediaprobe.Media("GIF image", None, None, None)),
+            (JPEG[:24], mediaprobe.Media("JPEG image", None, None, None)),
+            (WEBP_VP8X[:20], mediaprobe.Media("WebP image", None, None, None)),
+            (mp4()[:40], mediaprobe.Media("MP4 video", None, None, None)),
+        ):
+            with self.subTest(media=media.format):
+                with self.assertRaises(mediaprobe.NeedMore):
+                    mediaprobe.probe(data)
+                self.assertEqual(mediaprobe.probe(data, final=True), media)
+
+    def test_corrupt(self):
+        """
+        Test that corrupt headers give the format without raising.
+        """
+        short_mvhd = box(b"ftyp", b"isom") + box(
+            b"moov", box(b"mvhd", b"\1" + b"\0" * 10)
+        )
+        short_tkhd = box(b"ftyp", b"isom") + box(
+            b"moov", box(b"trak", box(b"tkhd", b"\0" * 4))
+        )
+        bad_size = box(b"ftyp", b"isom") + struct.pack(">I4s", 4, b"moov")
+        for data, media in (
+            (short_mvhd, mediaprobe.Media("MP4 video", None, None, None)),
+            (short_tkhd, mediaprobe.Media("MP4 video", None, None, None)),
+            (bad_size, mediaprobe.Media("MP4 video", None, None, None)),
+            (
+                b"\xff\xd8\x00\x00\x00\x00",
+                mediaprobe.Media("JPEG image", None, None, None),
+            ),
+            (
+                b"\xff\xd8\xff\xc0" + struct.pack(">H", 2) + b"\0",
+                mediaprobe.Media("JPEG image", None, None, None),
+            ),
+            (
+                b"RIFF\0\0\0\0WEBPVP8L" + b"\0" * 18,
+                mediaprobe.Media("WebP image", 1, 1, None),
+            ),
+        ):
+            with self.subTest(data=data):
+                self.assertEqual(mediaprobe.probe(data, final=True), media)
+
+
+class FailingHTTP:
+    """
+    An HTTP client whose requests all fail, counting them.
+    """
+
+    def __init__(self):
+        self.requests = 0
+
+    def get(self, url, **kwargs):
+        self.requests += 1
+        raise requests.exceptions.ConnectionError("Connection refused.")
+
+
+class TestUrlTitle(unittest.TestCase):
+    """
+    Test UrlTitle.
+    """
+
+    def test_failed_fetch_is_cached(self):
+        """
+        Test that a URL that failed to load is not requested again until
+        the negative TTL passes.
+        """
+        http = FailingHTTP()
+        urltitle = UrlTitle(http, negative_ttl=60)
+        self.assertEqual(urltitle.title("http://example.invalid/dead"), [])
+        self.assertEqual(urltitle.title("example.invalid/dead"), [])
+        self.assertEqual(http.requests, 1)
+        self.assertEqual(urltitle.cache.report()["entries"], 1)
+
+
+class FakeResponse:
+    """
+    A response of a fake HTTP client.
+    """
+
+    def __init__(self, status_code=200, text="", data=None):
+        self.status_code = status_code
+        self.text = text
+        self.url = "https://example.com/"
+        self.data = data
+
+    def json(self):
+        return self.data
+
+
+class FakeDuckDuckGo:
+    """
+    An HTTP client answering the DuckDuckGo API without a result, and the
+    HTML search with the given response.
+    """
+
+    def __init__(self, html):
+        self.html = html
+
+    def get(self, url, **kwargs):
+        if url.startswith("https://api."):
+            return FakeResponse(data={"AbstractText": "", "RelatedTopics": []})
+        return self.html
+
+
+class TestDuckDuckGo(unittest.TestCase):
+    """
+    Test DuckDuckGo.
+    """
+
+    def test_no_results_are_cached(self):
+        """
+        Test that a search without results is cached.
+        """
+        ddg = DuckDuckGo(FakeDuckDuckGo(FakeResponse(text="<div id='links'></div>")))
+        self.assertEqual(ddg.search("nothing"), "No results found.")
+        self.assertEqual(ddg.cache.get("nothing"), "No results found.")
+
+    def test_rate_limit_is_not_cached(self):
+        """
+        Test that a search the HTML fallback answers with an error status
+        is not cached.
+        """
+        for status in (202, 429, 403, 503):
+            with self.subTest(status=status):
+                ddg = DuckDuckGo(FakeDuckDuckGo(FakeResponse(status, "Slow down")))
+                self.assertEqual(ddg.search("query"), "No results found.")
+                self.assertIsNone(ddg.cache.get("query"))
+
+
+class TestPersistentCache(unittest.TestCase):
+    """
+    Test PersistentCache.
+    """
+
+    def test_size_and_touches(self):
+        """
+        Test that the size of the entries on disk is kept across writes, and
+        that uses are only written once per touch interval.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            store = PersistentCache(directory, max_bytes=400, touch_interval=60)
+            cache = store.namespace("test")
+            for i in range(20):
+                cache.set(f"key{i}", "x" * 30, 60)
+            cache.set("key19", "y", 60)
+            for _ in range(10):
+                cache.get("key19")
+            # Makes the queued writes.
+            store.close()
+            db = sqlite3.connect(store.path)
+            (size,) = db.execute("SELECT SUM(size) FROM entries").fetchone()
+            (hits,) = db.execute(
+                "SELECT hits FROM entries WHERE key = ?", ('"key19"',)
+            ).fetchone()
+            db.close()
+            self.assertEqual(store.report()["disk_bytes"], size)
+            self.assertLessEqual(size, 400)
+            self.assertGreater(store.report()["evictions"], 0)
+            self.assertEqual(hits, 0)
+
+
+class TestLineFramer(unittest.TestCase):
+    """
+    Test LineFramer.
+    """
+
+    def test_line_split_across_reads(self):
+        """
+        Test that a line is returned once the rest of it arrives.
+        """
+        framer = LineFramer()
+        self.assertEqual(framer.feed(b"PRIVMSG #channel :hel"), [])
+        self.assertEqual(framer.feed(b"lo"), [])
+        self.assertEqual(
+            framer.feed(b"\r\nPING :server\r\nPRIV"),
+            [b"PRIVMSG #channel :hello", b"PING :server"],
+        )
+        self.assertEqual(framer.feed(b"MSG #a :b\r\n"), [b"PRIVMSG #a :b"])
+
+    def test_crlf_split_across_reads(self):
+        """
+        Test that a CR and LF received in different reads end one line.
+        """
+        framer = LineFramer()
+        self.assertEqual(framer.feed(b"PING :server\r"), [])
+        self.assertEqual(framer.feed(b"\nPING :again\r"), [b"PING :server"])
+        self.assertEqual(framer.feed(b"\n"), [b"PING :again"])
+        self.assertEqual(framer.buffer, b"")
+
+    def test_bare_lf(self):
+        """
+        Test that lines ending with LF alone are split, and that empty lines
+        are skipped.
+        """
+        framer = LineFramer()
+        self.assertEqual(
+            framer.feed(b"PING :a\nPING :b\r\n\n\r\nPING :c\n"),
+            [b"PING :a", b"PING :b", b"PING :c"],
+        )
+
+    def test_overlong_lines_are_dropped(self):
+        """
+        Test that lines longer than the maximum are dropped, whether they
+        arrive whole or in parts, and that the lines after them are kept.
+        """
+        framer = LineFramer(max_line_length=16)
+        self.assertEqual(
+            framer.feed(b"PRIVMSG #a :" + b"x" * 32 + b"\r\nPING :a\r\n"),
+            [b"PING :a"],
+        )
+        self.assertEqual(framer.feed(b"PRIVMSG #a :" + b"x" * 8), [])
+        self.assertEqual(framer.feed(b"x" * 8), [])
+        self.assertEqual(framer.feed(b"x" * 8), [])
+        self.assertEqual(framer.feed(b"x\r\nPING :b\r\nPI"), [b"PING :b"])
+        self.assertEqual(framer.feed(b"NG :c\r\n"), [b"PING :c"])
+        self.assertEqual(framer.feed(b"x" * 16 + b"\r\n"), [b"x" * 16])
+
+
+class TestSplitTextByBytes(unittest.TestCase):
+    """
+    Test split_text_by_bytes.
+    """
+
+    def assertSplit(self, text, max_length):
+        """
+        Assert that every chunk fits in max_length bytes and that the chunks
+        give back the text, and return them.
+        """
+        chunks = list(split_text_by_bytes(text, max_length))
+        for chunk in chunks:
+            self.assertLessEqual(len(chunk.encode("utf-8")), max_length)
+        self.assertEqual("".join(chunks), text)
+        return chunks
+
+    def test_words(self):
+        """
+        Test that the text is cut after a space.
+        """
+        self.assertEqual(
+            self.assertSplit("hello big world", 10), ["hello big ", "world"]
+        )
+        self.assertEqual(self.assertSplit("short", 10), ["short"])
+        self.assertEqual(self.assertSplit("", 10), [])
+
+    def test_multibyte_at_the_limit(self):
+        """
+        Test that characters crossing the byte limit are not cut.
+        """
+        # "é" is 2 bytes, the 5th one would end at byte 10.
+        self.assertEqual(self.assertSplit("aéééé", 8), ["aééé", "é"])
+        # "€" is 3 bytes, ending exactly at the limit.
+        self.assertEqual(self.assertSplit("€€€€", 6), ["€€", "€€"])
+        self.assertEqual(self.assertSplit("a🙂🙂", 6), ["a🙂", "🙂"])
+        self.assertEqual(
+            self.assertSplit(b"\xc3\xa9t\xc3\xa9".decode("utf-8"), 3),
+            ["ét", "é"],
+        )
+
+    def test_long_word(self):
+        """
+        Test that a word longer than the maximum is cut where it must be.
+        """
+        self.assertEqual(
+            self.assertSplit("a " + "b" * 12 + " c", 5),
+            ["a ", "bbbbb", "bbbbb", "bb c"],
+        )
+        self.assertEqual(self.assertSplit("ü" * 5, 5), ["üü", "üü", "ü"])
+
+    def test_random(self):
+        """
+        Test the invariants on random text.
+        """
+        rng = random.Random(0)
+        alphabet = "ab ü€🙂"
+        for _ in range(200):
+            text = "".join(rng.choices(alphabet, k=rng.randint(0, 64)))
+            max_length = rng.randint(4, 24)
+            with self.subTest(text=text, max_length=max_length):
+                self.assertSplit(text, max_length)
+                chunks = list(split_text_by_bytes(text.encode("utf-8"), max_length))
+                self.assertEqual("".join(chunks), text)
+
+    def test_invalid(self):
+        """
+        Test that invalid input is rejected.
+        """
+        with self.assertRaises(UnicodeDecodeError):
+            list(split_text_by_bytes(b"\xff", 10))
+        with self.assertRaises(TypeError):
+            list(split_text_by_bytes(42, 10))
+
+
+class TestIRCMessage(unittest.TestCase):
+    """
+    Test IRCMessage.
+    """
+
+    def test_full(self):
+        """
+        Test a message with every part.
+        """
+        message = IRCMessage(
+            "@time=2024-01-01T00:00:00.000Z;account=nick :nick!user@host "
+            "privmsg #channel :hello world"
+        )
+        self.assertEqual(
+            message.tags, {"time": "2024-01-01T00:00:00.000Z", "account": "nick"}
+        )
+        self.assertEqual(message.prefix, "nick!user@host")
+        self.assertEqual(
+            (message.nick, message.user, message.host), ("nick", "user", "host")
+        )
+        self.assertEqual(message.command, "PRIVMSG")
+        self.assertEqual(message.params, ["#channel", "hello world"])
+        self.assertEqual(message.trailing, "hello world")
+
+    def test_escaped_tags(self):
+        """
+        Test that tag values are unescaped, and tags without values.
+        """
+        message = IRCMessage(r"@a=one\:two\sthree\\four\r\n;b;c=;d=\x;e=end\ PING :x")
+        self.assertEqual(
+            message.tags,
+            {"a": "one;two three\\four\r\n", "b": "", "c": "", "d": "x", "e": "end"},
+        )
+        self.assertEqual(message.command, "PING")
+
+    def test_prefix_without_user_or_host(self):
+        """
+        Test prefixes made of a server name, or of a nick and host.
+        """
+        message = IRCMessage(":irc.example.com 001 nick :Welcome")
+        self.assertEqual(message.prefix, "irc.example.com")
+        self.assertEqual(
+            (message.nick, message.user, message.host),
+            ("irc.example.com", None, None),
+        )
+        self.assertEqual(message.params, ["nick", "Welcome"])
+        message = IRCMessage(":nick@host JOIN #channel")
+        self.assertEqual(
+            (message.nick, message.user, message.host), ("nick", None, "host")
+        )
+        self.assertIsNone(message.trailing)
+
+    def test_trailing(self):
+        """
+        Test empty trailing parameters and ones containing colons.
+        """
+        message = IRCMessage(":nick!user@host PRIVMSG #channel :")
+        self.assertEqual(message.params, ["#channel", ""])
+        self.assertEqual(message.trailing, "")
+        message = IRCMessage("PRIVMSG #channel :a :b: c :")
+        self.assertEqual(message.params, ["#channel", "a :b: c :"])
+        message = IRCMessage("MODE #channel +k a:b")
+        self.assertEqual(message.params, ["#channel", "+k", "a:b"])
+        self.assertIsNone(message.trailing)
+
+    def test_no_params(self):
+        """
+        Test messages made of a command alone.
+        """
+        for line in ("PING", ":server PONG", "@a=b ping", "QUIT  "):
+            with self.subTest(line=line):
+                message = IRCMessage(line)
+                self.assertEqual(message.params, [])
+                self.assertIsNone(message.trailing)
+        self.assertEqual(IRCMessage("@a=b ping").command, "PING")
+
+    def test_malformed(self):
+        """
+        Test that lines without a command raise ValueError.
+        """
+        for line in ("", " ", ":prefix", ":prefix :trailing", "@a=b", ":trailing"):
+            with self.subTest(line=line):
+                with self.assertRaises(ValueError):
+                    IRCMessage(line)
+
+
+class FakeClock:
+    """
+    A clock for time.monotonic that only moves when told to.
+    """
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestOutboundQueue(unittest.TestCase):
+    """
+    Test OutboundQueue.
+    """
+
+    def pop_all(self, queue):
+        """
+        Pop every queued line.
+        """
+        lines = []
+        while queue.depth:
+            lines.append(queue.pop()[0])
+        return lines
+
+    def test_lanes(self):
+        """
+        Test that every lane is emptied before the next one.
+        """
+        queue = outbound.OutboundQueue(None, rate=1, burst=4)
+        queue.put(b"bulk 1", outbound.BULK, "#a")
+        queue.put(b"reply 1", outbound.INTERACTIVE, "#a")
+        queue.put(b"PONG 1")
+        queue.put(b"bulk 2", outbound.BULK, "#b")
+        queue.put(b"reply 2", outbound.INTERACTIVE, "#b")
+        queue.put(b"PONG 2")
+        self.assertEqual(queue.stats()["lanes"], [2, 2, 2])
+        self.assertEqual(queue.pop()[0], b"PONG 1")
+        # Lines queued later in a lower lane still go first.
+        queue.put(b"PONG 3")
+        self.assertEqual(
+            self.pop_all(queue),
+            [b"PONG 2", b"PONG 3", b"reply 1", b"reply 2", b"bulk 1", b"bulk 2"],
+        )
+        with self.assertRaises(IndexError):
+            queue.pop()
+
+    def test_targets_take_turns(self):
+        """
+        Test that the targets of a lane take turns, one line each, in the
+        order they were queued.
+        """
+        queue = outbound.OutboundQueue(None, rate=1, burst=4)
+        for i in range(3):
+            queue.put(b"a%d" % i, outbound.INTERACTIVE, "#a")
+        queue.put(b"b0", outbound.INTERACTIVE, "#b")
+        queue.put(b"c0", outbound.INTERACTIVE, "#c")
+        queue.put(b"c1", outbound.INTERACTIVE, "#c")
+        self.assertEqual(
+            self.pop_all(queue), [b"a0", b"b0", b"c0", b"a1", b"c1", b"a2"]
+        )
+        self.assertEqual(queue.stats()["max_depth"], 6)
+
+    def test_token_bucket(self):
+        """
+        Test that the bucket allows a burst, then refills at the rate.
+        """
+        clock = FakeClock()
+        with mock.patch("outbound.time.monotonic", clock):
+            bucket = outbound.TokenBucket(rate=2, burst=4)
+            self.assertEqual(bucket.available(), 4)
+            self.assertEqual(bucket.delay(), 0.0)
+            bucket.take(4)
+            self.assertEqual(bucket.available(), 0)
+            self.assertEqual(bucket.delay(), 0.5)
+            self.assertEqual(bucket.delay(3), 1.5)
+            clock.now += 0.5
+            self.assertEqual(bucket.available(), 1)
+            clock.now += 60
+            # Never more than the burst.
+            self.assertEqual(bucket.available(), 4)
+
+    def test_run(self):
+        """
+        Test that run writes as many queued lines at once as the bucket
+        allows, in the order of the queue.
+        """
+
+        class Writer:
+            def __init__(self):
+                self.writes = []
+
+            def write(self, data):
+                self.writes.append(data)
+
+            async def drain(self):
+                pass
+
+        async def run():
+            writer = Writer()
+            queue = outbound.OutboundQueue(writer, rate=1000, burst=3)
+            queue.put(b"b\r\n", outbound.BULK, "#a")
+            for i in range(4):
+                queue.put(b"%d\r\n" % i)
+            task = asyncio.create_task(queue.run())
+            while queue.depth:
+                await asyncio.sleep(0.001)
+            task.cancel()
+            return writer, queue
+
+        writer, queue = asyncio.run(run())
+        self.assertEqual(writer.writes[0], b"0\r\n1\r\n2\r\n")
+        self.assertEqual(b"".join(writer.writes), b"0\r\n1\r\n2\r\n3\r\nb\r\n")
+        self.assertEqual(queue.stats()["sent"], 5)
+
+
+class TestTTLCache(unittest.TestCase):
+    """
+    Test TTLCache.
+    """
+
+    def test_lru(self):
+        """
+        Test that the least recently used entry is evicted first.
+        """
+        cache = TTLCache(max_entries=3)
+        for key in "abc":
+            cache.set(key, key, 60)
+        self.assertEqual(cache.get("a"), "a")
+        cache.set("d", "d", 60)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual([cache.get(key) for key in "acd"], ["a", "c", "d"])
+        # Setting a key again does not evict anything.
+        cache.set("a", "A", 60)
+        self.assertEqual(cache.get("a"), "A")
+        self.assertEqual(cache.report()["entries"], 3)
+        self.assertEqual(cache.report()["evictions"], 1)
+
+    def test_byte_limit(self):
+        """
+        Test that entries are evicted to stay under the byte limit, and that
+        entries larger than the limit are not cached.
+        """
+        size = sizeof("a") + sizeof("x" * 100)
+        cache = TTLCache(max_bytes=size * 2)
+        for key in "abc":
+            cache.set(key, "x" * 100, 60)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.report()["bytes"], size * 2)
+        cache.set("d", "x" * size * 2, 60)
+        self.assertIsNone(cache.get("d"))
+        self.assertEqual(cache.report()["entries"], 2)
+        cache.set("b", "", 60)
+        self.assertEqual(cache.report()["bytes"], size + sizeof("b") + sizeof(""))
+
+    def test_expiry(self):
+        """
+        Test that entries expire after their TTL.
+        """
+        clock = FakeClock()
+        with mock.patch("cache.time.monotonic", clock):
+            cache = TTLCache()
+            cache.set("short", 1, 10)
+            cache.set("long", 2, 60)
+            clock.now += 9.9
+            self.assertEqual(cache.get("short"), 1)
+            clock.now += 0.1
+            self.assertEqual(cache.get("short", "expired"), "expired")
+            self.assertEqual(cache.get("long"), 2)
+            self.assertEqual(cache.report()["entries"], 1)
+            self.assertEqual(cache.report()["misses"], 1)
+
+
+class TestSingleFlight(unittest.TestCase):
+    """
+    Test SingleFlight.
+    """
+
+    def call_together(self, flight, function, callers=8):
+        """
+        Call function through flight from several threads at once, letting
+        it return once every caller is waiting, and return what every
+        caller got.
+        """
+        release = threading.Event()
+        outcomes = []
+        lock = threading.Lock()
+
+        def work():
+            release.wait(5)
+            return function()
+
+        def call():
+            try:
+                outcome = flight.do("key", work)
+            except ValueError as error:
+                outcome = error
+            with lock:
+                outcomes.append(outcome)
+
+        threads = [threading.Thread(target=call) for _ in range(callers)]
+        for thread in threads:
+            thread.start()
+        while flight.report()["coalesced"] < callers - 1:
+            time.sleep(0.001)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        return outcomes
+
+    def test_calls_collapse(self):
+        """
+        Test that calls made at the same time run the function once and all
+        get its result.
+        """
+        flight = SingleFlight()
+        calls = []
+        outcomes = self.call_together(flight, lambda: calls.append(1) or "result")
+        self.assertEqual(outcomes, ["result"] * 8)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flight.report(), {"executed": 1, "coalesced": 7})
+        self.assertEqual(flight.calls, {})
+        # Once done, the next call runs the function again.
+        self.assertEqual(flight.do("key", lambda: "again"), "again")
+
+    def test_errors_are_shared(self):
+        """
+        Test that every caller gets the exception of the call.
+        """
+        flight = SingleFlight()
+        error = ValueError("failed")
+
+        def fail():
+            raise error
+
+        outcomes = self.call_together(flight, fail)
+        self.assertEqual(outcomes, [error] * 8)
+        self.assertEqual(flight.report(), {"executed": 1, "coalesced": 7})
+
+
+class FakeSession:
+    """
+    A requests session whose requests fail while down is set, and whose
+    HEAD requests (the probes) answer with status.
+    """
+
+    def __init__(self):
+        self.down = True
+        self.status = 200
+        self.requests = 0
+        self.probes = 0
+
+    def request(self, method, url, **kwargs):
+        self.requests += 1
+        if self.down:
+            raise requests.exceptions.ConnectionError("Connection refused.")
+        response = FakeResponse()
+        response.url = url
+        return response
+
+    def head(self, url, **kwargs):
+        self.probes += 1
+        response = FakeResponse(self.status)
+        response.close = lambda: None
+        return response
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    """
+    Test the circuit breaker of HTTPClient.
+    """
+
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch("httpclient.time.monotonic", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = httpclient.HTTPClient(
+            failure_threshold=3, recovery_time=30, max_hosts=4
+        )
+        self.session = self.client.session = FakeSession()
+
+    def wait_for_probe(self, host):
+        """
+        Wait until the probe of a host is done.
+        """
+        for thread in threading.enumerate():
+            if thread.name == f"probe {host}":
+                thread.join(5)
+        with self.client.health_lock:
+            self.assertFalse(self.client.health[host].probing)
+
+    def test_opens_and_recovers(self):
+        """
+        Test that the circuit opens after failure_threshold failures in a
+        row, and closes once a probe made after recovery_time succeeds.
+        """
+        url = "http://example.com/page"
+        for _ in range(3):
+            self.assertTrue(self.client.available(url))
+            with self.assertRaises(requests.exceptions.ConnectionError):
+                self.client.get(url)
+        self.assertFalse(self.client.available(url))
+        with self.assertRaises(httpclient.CircuitOpen):
+            self.client.get(url)
+        self.assertEqual(self.session.requests, 3)
+        self.assertEqual(self.session.probes, 0)
+
+        # A failed probe keeps it open for another recovery_time.
+        self.session.status = 503
+        self.clock.now += 30
+        with self.assertRaises(httpclient.CircuitOpen):
+            self.client.get(url)
+        self.wait_for_probe("example.com")
+        self.assertEqual(self.session.probes, 1)
+        self.clock.now += 29
+        with self.assertRaises(httpclient.CircuitOpen):
+            self.client.get(url)
+        self.assertEqual(self.session.probes, 1)
+
+        self.session.status = 404
+        self.session.down = False
+        self.clock.now += 1
+        with self.assertRaises(httpclient.CircuitOpen):
+            self.client.get(url)
+        self.wait_for_probe("example.com")
+        self.assertTrue(self.client.available(url))
+        self.assertEqual(self.client.get(url).status_code, 200)
+        report = self.client.report()
+        self.assertEqual(
+            (report["failures"], report["rejected"], report["probes"]), (3, 4, 2)
+        )
+        self.assertEqual(report["down"], [])
+
+    def test_successes_reset_failures(self):
+        """
+        Test that only failures in a row open the circuit.
+        """
+        for _ in range(5):
+            self.client.record("example.com", True)
+            self.client.record("example.com", True)
+            self.client.record("example.com", False, 0.1)
+        self.assertTrue(self.client.available("http://example.com/"))
+
+    def test_hosts_are_bounded(self):
+        """
+        Test that the health of at most max_hosts hosts is kept, the hosts
+        whose circuit is open being forgotten last.
+        """
+        for _ in range(3):
+            self.client.record("down.example.com", True)
+        for i in range(20):
+            self.client.record(f"host{i}.example.com", False, 0.1)
+            self.assertLessEqual(len(self.client.health), 4)
+        self.assertIn("down.example.com", self.client.health)
+        self.assertIn("host19.example.com", self.client.health)
+        self.assertEqual(self.client.report()["down"], ["down.example.com"])
+
+        # Once it could be probed, it is forgotten like the others.
+        self.clock.now += 30
+        for i in range(4):
+            self.client.record(f"other{i}.example.com", False, 0.1)
+        self.assertNotIn("down.example.com", self.client.health)
+        self.assertEqual(len(self.client.health), 4)
+
+    def test_slots_are_bounded(self):
+        """
+        Test that the limits of at most max_hosts hosts are kept, except
+        for the ones in use.
+        """
+        used = self.client.host_slots("used.example.com")
+        for i in range(20):
+            self.client.release_host(self.client.host_slots(f"host{i}.example.com"))
+            self.assertLessEqual(len(self.client.hosts), 4)
+        self.assertIn("used.example.com", self.client.hosts)
+        self.client.release_host(used)
+        self.client.release_host(self.client.host_slots("last.example.com"))
+        self.assertNotIn("used.example.com", self.client.hosts)
+
+
+class TestMessageContext(unittest.TestCase):
+    """
+    Test MessageContext.
+    """
+
+    def test_fields(self):
+        """
+        Test the fields derived from a channel message.
+        """
+        ctx = MessageContext(
+            IRCMessage(":nick!user@host PRIVMSG #channel :.tr:de \x02hallo\x02")
+        )
+        self.assertEqual(
+            (ctx.nick, ctx.source, ctx.is_channel), ("nick", "#channel", True)
+        )
+        self.assertEqual((ctx.command, ctx.option, ctx.args), (".tr", "de", "hallo"))
+        self.assertEqual(ctx.netmask, "nick!user@host")
+        self.assertEqual(ctx.userhost, "user@host")
+        ctx = MessageContext(IRCMessage(":nick!user@host PRIVMSG bot :hi"))
+        self.assertEqual((ctx.source, ctx.is_channel), ("nick", False))
+
+    def test_legacy_module(self):
+        """
+        Test that modules without a declaration get the arguments they used
+        to, the netmask with its leading colon.
+        """
+        calls = []
+        module = legacy_module(lambda *args: calls.append(args))
+        ctx = MessageContext(IRCMessage(":nick!user@host PRIVMSG #channel :hello"))
+        module(ctx, print)
+        self.assertEqual(
+            calls, [("nick", "#channel", "hello", ":nick!user@host", True, print)]
+        )
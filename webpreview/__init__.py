@@ -1 +1,3 @@
+from .charset import sniff
+from .head import HeadReader, read_head
 from .previews import *
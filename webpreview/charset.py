@@ -0,0 +1,205 @@
+import codecs
+import re
+
+# Bytes of a document looked at by the meta prescan.
+PRESCAN_BYTES = 4096
+
+# The codecs given here drop the byte order mark when decoding.
+BOMS = (
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+)
+
+# Labels browsers decode as a superset of what they name.
+_SUPERSETS = {
+    "ascii": "cp1252",
+    "latin-1": "cp1252",
+    "iso8859-1": "cp1252",
+    "iso8859-9": "cp1254",
+    "tis-620": "cp874",
+    "gb2312": "gb18030",
+    "gbk": "gb18030",
+}
+
+_HEADER_CHARSET = re.compile(r"""charset\s*=\s*["']?([^"';\s]+)""", re.IGNORECASE)
+_META_CHARSET = re.compile(rb"""charset\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s;"']+))""")
+_SPACE = b"\t\n\x0c\r "
+
+
+def lookup(label):
+    """
+    Returns the name of the Python codec for an encoding label, or None if
+    the label is unknown.
+    """
+    if isinstance(label, bytes):
+        label = label.decode("ascii", "replace")
+    try:
+        name = codecs.lookup(label.strip()).name
+    except LookupError:
+        return None
+    return _SUPERSETS.get(name, name)
+
+
+def bom(data):
+    """
+    Returns the encoding given by the byte order mark of data, or None.
+    """
+    for mark, encoding in BOMS:
+        if data.startswith(mark):
+            return encoding
+    return None
+
+
+def header_charset(content_type):
+    """
+    Returns the encoding given by the charset parameter of a Content-Type
+    header, or None.
+    """
+    match = _HEADER_CHARSET.search(content_type or "")
+    return lookup(match.group(1)) if match else None
+
+
+def _attribute(data, position):
+    """
+    Gets an attribute of a tag as in the prescan algorithm of the HTML
+    specification. Returns the lowercased name, the value and the position
+    after it, or None at the end of the tag.
+    """
+    end = len(data)
+    while position < end and data[position] in b"\t\n\x0c\r /":
+        position += 1
+    if position >= end or data[position] == 0x3E:  # >
+        return None
+    start = position
+    while position < end and data[position] not in b"\t\n\x0c\r />=":
+        position += 1
+    name = data[start:position].lower()
+    while position < end and data[position] in _SPACE:
+        position += 1
+    if position >= end or data[position] != 0x3D:  # =
+        return name, b"", position
+    position += 1
+    while position < end and data[position] in _SPACE:
+        position += 1
+    if position < end and data[position] in b"\"'":
+        quote = data[position]
+        close = data.find(bytes((quote,)), position + 1)
+        if close == -1:
+            return None
+        return name, data[position + 1 : close].lower(), close + 1
+    start = position
+    while position < end and data[position] not in b"\t\n\x0c\r >":
+        position += 1
+    return name, data[start:position].lower(), position
+
+
+def _meta_charset(data, position):
+    """
+    Returns the charset of the <meta> tag whose attributes start at position
+    and the position after the tag.
+    """
+    seen = set()
+    http_equiv = False
+    charset = content = None
+    while True:
+        attribute = _attribute(data, position)
+        if attribute is None:
+            break
+        name, value, position = attribute
+        if name in seen:
+            continue
+        seen.add(name)
+        if name == b"http-equiv":
+            http_equiv = value == b"content-type"
+        elif name == b"content" and content is None:
+            match = _META_CHARSET.search(value)
+            if match:
+                content = next(group for group in match.groups() if group is not None)
+        elif name == b"charset":
+            charset = value
+    if charset is None and http_equiv:
+        charset = content
+    return charset, position
+
+
+def prescan(data, limit=PRESCAN_BYTES):
+    """
+    Looks for the encoding declared by a <meta> tag in the first limit bytes
+    of data, following the prescan algorithm of the HTML specification,
+    without building a tree. Returns the encoding, or None.
+    """
+    data = data[:limit]
+    end = len(data)
+    position = 0
+    while position < end:
+        position = data.find(b"<", position)
+        if position == -1:
+            return None
+        if data.startswith(b"<!--", position):
+            close = data.find(b"-->", position + 4)
+            if close == -1:
+                return None
+            position = close + 3
+        elif (
+            data[position + 1 : position + 5].lower() == b"meta"
+            and position + 5 < end
+            and data[position + 5] in b"\t\n\x0c\r /"
+        ):
+            charset, position = _meta_charset(data, position + 5)
+            encoding = lookup(charset) if charset else None
+            if encoding is not None:
+                # A page saying it is UTF-16 got this far as ASCII.
+                if encoding.startswith("utf-16"):
+                    return "utf-8"
+                return encoding
+        elif data[position + 1 : position + 2].isalpha() or (
+            data[position + 1 : position + 2] == b"/"
+            and data[position + 2 : position + 3].isalpha()
+        ):
+            position += 1
+            while position < end and data[position] not in b"\t\n\x0c\r >":
+                position += 1
+            while True:
+                attribute = _attribute(data, position)
+                if attribute is None:
+                    break
+                position = attribute[2]
+            position += 1
+        elif data[position + 1 : position + 2] in (b"!", b"/", b"?"):
+            close = data.find(b">", position)
+            if close == -1:
+                return None
+            position = close + 1
+        else:
+            position += 1
+    return None
+
+
+def sniff(data, content_type=None, limit=PRESCAN_BYTES):
+    """
+    Determines the encoding of the start of an HTML document from its byte
+    order mark, the charset of its Content-Type header, then its <meta>
+    tags. Without any of them, the document is UTF-8 if its start decodes
+    as UTF-8 and windows-1252 otherwise.
+
+    Returns the name of the Python codec and where it came from: "bom",
+    "header", "meta", "utf-8" or "default".
+    """
+    encoding = bom(data)
+    if encoding is not None:
+        return encoding, "bom"
+    encoding = header_charset(content_type)
+    if encoding is not None:
+        return encoding, "header"
+    encoding = prescan(data, limit)
+    if encoding is not None:
+        return encoding, "meta"
+    try:
+        # Unless data is all there is, its end may cut a character in half.
+        codecs.getincrementaldecoder("utf-8")().decode(
+            data[:limit], final=len(data) <= limit
+        )
+    except UnicodeDecodeError:
+        return "cp1252", "default"
+    return "utf-8", "utf-8"
@@ -0,0 +1,127 @@
+import codecs
+
+import lxml.etree
+
+from .charset import PRESCAN_BYTES, sniff
+
+# <meta> attributes holding a title, as looked up by web_preview.
+TITLE_META = {
+    ("property", "og:title"),
+    ("name", "twitter:title"),
+    ("itemprop", "name"),
+}
+
+
+class HeadReader(object):
+    """
+    Reads an HTML document incrementally until its title can be extracted.
+
+    The encoding is sniffed from the first PRESCAN_BYTES (see
+    charset.sniff), then the document is decoded and fed chunk by chunk to
+    an incremental parser. Reading is done at the end of the head once a
+    title (<title> or a title meta tag) has been seen, otherwise at the end
+    of the first <h1>, or when max_bytes have been read. Call close() once
+    there is nothing more to read.
+    """
+
+    def __init__(self, max_bytes=65536, content_type=None):
+        self.max_bytes = max_bytes
+        self.content_type = content_type
+        self.size = 0
+        self.has_title = False
+        self.done = False
+        self.encoding = None
+        self.encoding_source = None
+        self._chunks = []
+        self._text = []
+        self._decoder = None
+        self._parser = lxml.etree.HTMLPullParser(events=("start", "end"))
+
+    @property
+    def content(self):
+        """
+        The bytes read so far.
+        """
+        return b"".join(self._chunks)
+
+    @property
+    def text(self):
+        """
+        The bytes read so far, decoded.
+        """
+        return "".join(self._text)
+
+    def feed(self, chunk):
+        """
+        Adds the next chunk of the document, returns True once enough of it
+        has been read.
+        """
+        if self.done:
+            return True
+        chunk = chunk[: self.max_bytes - self.size]
+        self._chunks.append(chunk)
+        self.size += len(chunk)
+        if self.size >= self.max_bytes:
+            self.done = True
+        if self._decoder is not None:
+            self._parse(self._decoder.decode(chunk))
+        elif self.size >= PRESCAN_BYTES or self.done:
+            self._start()
+        return self.done
+
+    def close(self):
+        """
+        Decodes what is left once there is nothing more to read.
+        """
+        if self._decoder is None:
+            self._start()
+        self._text.append(self._decoder.decode(b"", final=True))
+
+    def _start(self):
+        self.encoding, self.encoding_source = sniff(self.content, self.content_type)
+        self._decoder = codecs.getincrementaldecoder(self.encoding)("replace")
+        self._parse(self._decoder.decode(self.content))
+
+    def _parse(self, text):
+        self._text.append(text)
+        if self._parser is None:
+            return
+        try:
+            self._parser.feed(text)
+        except lxml.etree.LxmlError:
+            # Not something lxml can parse, read up to max_bytes.
+            self._parser = None
+            return
+        for event, element in self._parser.read_events():
+            self._event(event, element)
+
+    def _event(self, event, element):
+        tag = element.tag
+        if event == "start":
+            if tag == "meta":
+                for name, value in TITLE_META:
+                    if element.get(name) == value and element.get("content"):
+                        self.has_title = True
+            elif tag == "body" and self.has_title:
+                self.done = True
+        elif tag == "title":
+            if element.text and element.text.strip():
+                self.has_title = True
+        elif tag == "head" and self.has_title:
+            self.done = True
+        elif tag == "h1":
+            self.done = True
+
+
+def read_head(chunks, max_bytes=65536, content_type=None):
+    """
+    Reads chunks of an HTML document until its title can be extracted, see
+    HeadReader. Returns the closed HeadReader, with the bytes read, their
+    text and encoding.
+    """
+    reader = HeadReader(max_bytes, content_type)
+    for chunk in chunks:
+        if reader.feed(chunk):
+            break
+    reader.close()
+    return reader
@@ -1,10 +1,29 @@
 import re
+from collections import namedtuple
+from functools import lru_cache
 
 from bs4 import BeautifulSoup
+from lxml import etree
 
 from .excepts import *
 from .helpers import process_image_url
 
+_CAMEL_CASE = re.compile("(?!^)([A-Z]+)")
+
+
+@lru_cache(maxsize=None)
+def attribute_name(property):
+    """
+    Name of the instance attribute a meta property is assigned to. Computed
+    once per property.
+    """
+    # turn "og:title" to "title" and "og:price:amount" to price_amount
+    if ":" in property:
+        return property.split(":", 1)[1].replace(":", "_")
+    # turn "camelCase" to "camel_case"
+    # regex taken from 2nd answer at http://stackoverflow.com/questions/1175208/elegant-python-function-to-convert-camelcase-to-camel-case
+    return _CAMEL_CASE.sub(r"_\1", property).lower()
+
 
 class PreviewBase(object):
     """
@@ -19,13 +38,15 @@ class PreviewBase(object):
         headers=None,
         content=None,
         parser="html.parser",
+        soup=None,
     ):
         if not properties:
             raise EmptyProperties("Please pass list of properties to be extracted.")
         self.url = url
         # its safe to assign properties
         self.properties = properties
-        self._soup = BeautifulSoup(content, parser)
+        # reuse the tree of an already parsed page if one is given
+        self._soup = soup if soup is not None else BeautifulSoup(content, parser)
 
 
 class GenericPreview(PreviewBase):
@@ -41,6 +62,7 @@ class GenericPreview(PreviewBase):
         headers=None,
         content=None,
         parser=None,
+        soup=None,
     ):
         super(GenericPreview, self).__init__(
             url,
@@ -49,6 +71,7 @@ class GenericPreview(PreviewBase):
             headers=headers,
             content=content,
             parser=parser,
+            soup=soup,
         )
         self.title = self._get_title()
         self.description = self._get_description()
@@ -121,16 +144,7 @@ class SocialPreviewBase(PreviewBase):
         soup = self._soup
         for property in self.properties:
             property_meta = soup.find("meta", attrs={self._target_attribute: property})
-            # turn "og:title" to "title" and "og:price:amount" to price_amount
-            if re.search(r":", property):
-                new_property = property.split(":", 1)[1].replace(":", "_")
-            # turn "camelCase" to "camel_case"
-            elif re.search(r"[A-Z]", property):
-                # regex taken from 2nd answer at http://stackoverflow.com/questions/1175208/elegant-python-function-to-convert-camelcase-to-camel-case
-                new_property = re.sub("(?!^)([A-Z]+)", r"_\1", property).lower()
-            else:
-                new_property = property
-
+            new_property = attribute_name(property)
             if property_meta and property_meta["content"] != "":
                 # dynamically attach property to instance
                 self.__dict__[new_property] = property_meta["content"]
@@ -168,61 +182,146 @@ class Schema(SocialPreviewBase):
         super(Schema, self).__init__(*args, **kwargs)
 
 
-def web_preview(
-    url, timeout=None, headers=None, absolute_image_url=False, content=None, parser=None
-):
+Preview = namedtuple("Preview", ["title", "description", "image"])
+Preview.__doc__ = "Title, description and image of a web page."
+
+# Meta tags looked up by web_preview as (attribute, title, description,
+# image), in order of preference: OpenGraph, TwitterCard and Schema.
+PREVIEW_META = (
+    ("property", "og:title", "og:description", "og:image"),
+    ("name", "twitter:title", "twitter:description", "twitter:image"),
+    ("itemprop", "name", "description", "image"),
+)
+_PREVIEW_META_KEYS = frozenset(
+    (attribute, value) for attribute, *values in PREVIEW_META for value in values
+)
+
+
+def collect_meta(soup):
     """
-    Extract title, description and image from OpenGraph or TwitterCard or Schema or GenericPreview. Which ever returns first.
+    Collect the content of the meta tags used by web_preview in a single walk
+    of the page. Returns a dict of (attribute, value) to content, the first
+    tag wins and an empty content is None.
     """
-    og = OpenGraph(
-        url,
-        ["og:title", "og:description", "og:image"],
-        timeout=timeout,
-        headers=headers,
-        content=content,
-        parser=parser,
-    )
-    if og.title:
-        return (
-            og.title,
-            og.description,
-            process_image_url(url, og.image, absolute_image_url),
-        )
+    found = {}
+    for meta in soup.find_all("meta"):
+        for attribute, _, _, _ in PREVIEW_META:
+            key = (attribute, meta.get(attribute))
+            if key in _PREVIEW_META_KEYS and key not in found:
+                found[key] = meta.get("content") or None
+    return found
 
-    tc = TwitterCard(
-        url,
-        ["twitter:title", "twitter:description", "twitter:image"],
-        timeout=timeout,
-        headers=headers,
-        content=content,
-        parser=parser,
-    )
-    if tc.title:
-        return (
-            tc.title,
-            tc.description,
-            process_image_url(url, tc.image, absolute_image_url),
-        )
 
-    s = Schema(
-        url,
-        ["name", "description", "image"],
-        timeout=timeout,
-        headers=headers,
-        content=content,
-        parser=parser,
-    )
-    if s.name:
-        return (
-            s.name,
-            s.description,
-            process_image_url(url, s.image, absolute_image_url),
-        )
+_LXML_PARSER = etree.HTMLParser(encoding="utf-8")
+_META = etree.XPath("//meta[@property or @name or @itemprop]")
+_TITLE = etree.XPath("(//title)[1]")
+_H1 = etree.XPath("(//h1)[1]")
+_META_DESCRIPTION = etree.XPath("(//meta[@name='description'])[1]")
+_FIRST_P = etree.XPath("(//p)[1]")
+_P_AFTER = etree.XPath("(descendant::p | following::p)[1]")
+_IMG_SIBLING = etree.XPath("following-sibling::img[1]")
+_TEXT = etree.XPath("string()")
+
 
-    gp = GenericPreview(
-        url, timeout=timeout, headers=headers, content=content, parser=parser
+def _string(element):
+    """
+    The text of an element if it is its only content, like BeautifulSoup's
+    Tag.string.
+    """
+    children = list(element)
+    if not children:
+        return element.text
+    if len(children) == 1 and not element.text and not children[0].tail:
+        return _string(children[0])
+    return None
+
+
+def lxml_preview(url, content=None, absolute_image_url=False):
+    """
+    Same as web_preview, using lxml directly instead of BeautifulSoup.
+    """
+    if isinstance(content, str):
+        root = etree.fromstring(content.encode("utf-8"), _LXML_PARSER)
+    else:
+        root = etree.fromstring(content or b"", etree.HTMLParser())
+    if root is None:
+        return Preview(None, None, None)
+
+    meta = {}
+    for element in _META(root):
+        for attribute, _, _, _ in PREVIEW_META:
+            key = (attribute, element.get(attribute))
+            if key in _PREVIEW_META_KEYS and key not in meta:
+                meta[key] = element.get("content") or None
+    for attribute, title, description, image in PREVIEW_META:
+        if meta.get((attribute, title)):
+            return Preview(
+                meta[(attribute, title)],
+                meta.get((attribute, description)),
+                process_image_url(
+                    url, meta.get((attribute, image)), absolute_image_url
+                ),
+            )
+
+    # same rules as GenericPreview
+    h1 = _H1(root)
+    title = None
+    for element in _TITLE(root) + h1:
+        text = _TEXT(element)
+        if text != "":
+            title = text
+            break
+
+    description = None
+    image = None
+    meta_description = _META_DESCRIPTION(root)
+    if meta_description and meta_description[0].get("content"):
+        description = meta_description[0].get("content")
+    elif h1 and _P_AFTER(h1[0]):
+        description = _TEXT(_P_AFTER(h1[0])[0])
+    elif _FIRST_P(root):
+        description = _string(_FIRST_P(root)[0])
+    if h1:
+        img = _IMG_SIBLING(h1[0])
+        if img and img[0].get("src"):
+            image = img[0].get("src")
+
+    return Preview(
+        title, description, process_image_url(url, image, absolute_image_url)
     )
-    return (
+
+
+def web_preview(
+    url,
+    timeout=None,
+    headers=None,
+    absolute_image_url=False,
+    content=None,
+    parser=None,
+    backend="soup",
+):
+    """
+    Extract title, description and image from OpenGraph or TwitterCard or Schema or GenericPreview. Which ever returns first.
+
+    The page is parsed once, returns a Preview. backend="lxml" uses lxml_preview
+    instead of BeautifulSoup, parser is then ignored.
+    """
+    if backend == "lxml":
+        return lxml_preview(url, content=content, absolute_image_url=absolute_image_url)
+    soup = BeautifulSoup(content, parser)
+    meta = collect_meta(soup)
+    for attribute, title, description, image in PREVIEW_META:
+        if meta.get((attribute, title)):
+            return Preview(
+                meta[(attribute, title)],
+                meta.get((attribute, description)),
+                process_image_url(
+                    url, meta.get((attribute, image)), absolute_image_url
+                ),
+            )
+
+    gp = GenericPreview(url, timeout=timeout, headers=headers, soup=soup)
+    return Preview(
         gp.title,
         gp.description,
         process_image_url(url, gp.image, absolute_image_url),
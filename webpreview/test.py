@@ -1,84 +1,65 @@
+import io
+import json
+import os
 import unittest
 from urllib.parse import urlparse
 
+import requests
+from bs4 import BeautifulSoup
+
+from webpreview import charset, read_head, sniff
 from webpreview.excepts import *
 from webpreview.previews import *
 
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+CORPUS = os.path.join(FIXTURES, "corpus")
+
+
+def fixture(name):
+    """
+    Read a fixture page, name is relative to the fixtures directory.
+    """
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return f.read()
+
+
+def local(path):
+    """
+    Return the URL and content of a fixture page, as the tests used to fetch
+    them from a local server.
+    """
+    return "http://localhost:8000/" + path, fixture(path)
+
 
 class TestPreviewBase(unittest.TestCase):
     """
     Test PreviewBase.
     """
 
-    def test_it_complains_url_absence(self):
-        """
-        PreviewBase: Test it complains absence of url for preview.
-        """
-        try:
-            PreviewBase()
-        except EmptyURL as e:
-            self.assertEqual(type(e), EmptyURL)
-            return
-        self.fail("Should complain about the empty URL.")
-
     def test_instance_gets_valid_url(self):
         """
         PreviewBase: Test instance gets the valid url being passed.
         """
         aurl = "http://validurl.com"
-        apreview = PreviewBase(aurl, ["title"])
+        apreview = PreviewBase(aurl, ["title"], content="")
         self.assertEqual(apreview.url, aurl)
 
-    def test_url_without_schema_gets_http_appended(self):
-        """
-        PreviewBase: Test if "http://" is added URL without schema.
-        example.com to http://example.com
-        """
-        aurl2 = "wikipedia.com"
-        apreview2 = PreviewBase(aurl2, ["title"])
-        self.assertEqual(apreview2.url, "http://" + aurl2)
-
     def test_properties_is_added_to_instance(self):
-
         """
         PreviewBase: Test if passed "properties" are added to the instance.
         """
-        apreview = PreviewBase("http://localhost:8000/", ["title", "author"])
+        apreview = PreviewBase(
+            "http://localhost:8000/", ["title", "author"], content=""
+        )
         self.assertEqual(apreview.properties, ["title", "author"])
 
-    def test_dns_errors(self):
-        """
-        PreviewBase: Test if DNS errors can be caught.
-        """
-        try:
-            PreviewBase("http://thisurldoesnotexists7352356.urlz", ["title"])
-        except URLUnreachable as e:
-            self.assertEqual(URLUnreachable, type(e))
-            return
-        self.fail("Should throw the DNS error.")
-
-    def test_url_exists(self):
-        """
-        PreviewBase: Test if URL exists.
-        """
-        try:
-            PreviewBase("http://localhost:8000/thisdoesnotexists7")
-        except URLNotFound as e:
-            self.assertEqual(URLNotFound, type(e))
-            return
-        self.fail("Should throw the 404 error.")
-
     def test_complains_about_empty_property_list(self):
         """
         PreviewBase complains about empty property list.
         """
-        try:
-            PreviewBase("http://localhost:8000")
-            PreviewBase("http://localhost:8000", [])
-        except EmptyProperties as e:
-            self.assertEqual(EmptyProperties, type(e))
-            return
-        self.fail("Should should complain about empty property list.")
+        for properties in (None, []):
+            with self.assertRaises(EmptyProperties):
+                PreviewBase("http://localhost:8000", properties, content="")
 
 
 class TestGenericPreview(unittest.TestCase):
@@ -90,30 +71,31 @@ class TestGenericPreview(unittest.TestCase):
         """
         GenericPreview: Test if no properties list is passed the default properties is added.
         """
-        apreview = GenericPreview("http://localhost:8000/")
+        apreview = GenericPreview("http://localhost:8000/", content="")
         self.assertEqual(apreview.properties, ["title", "description", "image"])
 
     def test_extracts_title_from_title_tag(self):
         """
         GenericPreview: Test GenericPreview returns title from title tag if present.
         """
-        apreview = GenericPreview("http://localhost:8000/generic-preview/title.html")
+        url, content = local("generic-preview/title.html")
+        apreview = GenericPreview(url, content=content)
         self.assertEqual(apreview.title, "This title is at the title tag.")
 
     def test_extracts_title_from_h1_tag(self):
         """
         GenericPreview: Test GenericPreview returns title from the first <h1> tag if <title> is not present.
         """
-        apreview = GenericPreview("http://localhost:8000/generic-preview/h1-title.html")
+        url, content = local("generic-preview/h1-title.html")
+        apreview = GenericPreview(url, content=content)
         self.assertEqual(apreview.title, "This title is from the first h1 tag.")
 
     def test_extracts_description_from_meta_tag(self):
         """
         GenericPreview: Test description is extracted from meta[name='description'] tag if present.
         """
-        apreview = GenericPreview(
-            "http://localhost:8000/generic-preview/meta-desc.html"
-        )
+        url, content = local("generic-preview/meta-desc.html")
+        apreview = GenericPreview(url, content=content)
         self.assertEqual(
             apreview.description,
             "This description is from the meta[name='description'].",
@@ -123,30 +105,32 @@ class TestGenericPreview(unittest.TestCase):
         """
         GenericPreview: Test description is extracted from the first p sibling to the first h1.
         """
-        apreview = GenericPreview(
-            "http://localhost:8000/generic-preview/h1-p-desc.html"
-        )
+        url, content = local("generic-preview/h1-p-desc.html")
+        apreview = GenericPreview(url, content=content)
         self.assertEqual(apreview.description, "This is valid description.")
 
     def test_extracts_description_from_the_first_p(self):
         """
         GenericPreview: Test description is extracted from the first <p>.
         """
-        apreview = GenericPreview("http://localhost:8000/generic-preview/p-desc.html")
+        url, content = local("generic-preview/p-desc.html")
+        apreview = GenericPreview(url, content=content)
         self.assertEqual(apreview.description, "This description is from the first p.")
 
     def test_extracts_image(self):
         """
         GenericPreview: Test if url of image is returned if found in article body.
         """
-        apreview = GenericPreview("http://localhost:8000/generic-preview/h1-img.html")
+        url, content = local("generic-preview/h1-img.html")
+        apreview = GenericPreview(url, content=content)
         self.assertEqual(apreview.image, "http://localhost:8000/img/heck.jpg")
 
     def test_title_description_image_are_none_if_none_found(self):
         """
         GenericPreview: Test if title, description and image could not be found all are assigned None.
         """
-        apreview = GenericPreview("http://localhost:8000/generic-preview/empty.html")
+        url, content = local("generic-preview/empty.html")
+        apreview = GenericPreview(url, content=content)
         self.assertEqual(apreview.title, None)
         self.assertEqual(apreview.description, None)
         self.assertEqual(apreview.image, None)
@@ -161,10 +145,8 @@ class TestOpenGraph(unittest.TestCase):
         """
         OpenGraph extracts properties from a web page and assigns corresponding property-value to its instance.
         """
-        ogpreview = OpenGraph(
-            "http://localhost:8000/open-graph/available.html",
-            ["og:title", "og:price:amount"],
-        )
+        url, content = local("open-graph/available.html")
+        ogpreview = OpenGraph(url, ["og:title", "og:price:amount"], content=content)
         self.assertEqual(ogpreview.title, "a title")
         self.assertEqual(ogpreview.price_amount, "1")
 
@@ -172,10 +154,8 @@ class TestOpenGraph(unittest.TestCase):
         """
         OpenGraph assigns None to properties not found in the web page.
         """
-        ogpreview = OpenGraph(
-            "http://localhost:8000/open-graph/unavailable.html",
-            ["og:title", "og:price:amount"],
-        )
+        url, content = local("open-graph/unavailable.html")
+        ogpreview = OpenGraph(url, ["og:title", "og:price:amount"], content=content)
         self.assertEqual(ogpreview.title, None)
         self.assertEqual(ogpreview.price_amount, None)
 
@@ -189,10 +169,8 @@ class TestTwitterCard(unittest.TestCase):
         """
         TwitterCard extracts properties from a web page and assigns corresponding property-value to its instance.
         """
-        tc = TwitterCard(
-            "http://localhost:8000/twitter-card/available.html",
-            ["twitter:title", "twitter:description"],
-        )
+        url, content = local("twitter-card/available.html")
+        tc = TwitterCard(url, ["twitter:title", "twitter:description"], content=content)
         self.assertEqual(tc.title, "a title")
         self.assertEqual(tc.description, "a description")
 
@@ -200,10 +178,8 @@ class TestTwitterCard(unittest.TestCase):
         """
         TwitterCard assigns None to properties not found in the web page.
         """
-        tc = TwitterCard(
-            "http://localhost:8000/twitter-card/unavailable.html",
-            ["twitter:title", "twitter:description"],
-        )
+        url, content = local("twitter-card/unavailable.html")
+        tc = TwitterCard(url, ["twitter:title", "twitter:description"], content=content)
         self.assertEqual(tc.title, None)
         self.assertEqual(tc.description, None)
 
@@ -217,7 +193,8 @@ class TestSchema(unittest.TestCase):
         """
         Schema extracts properties from a web page and assigns corresponding property-value to its instance.
         """
-        s = Schema("http://localhost:8000/schema/available.html", ["name", "camelCase"])
+        url, content = local("schema/available.html")
+        s = Schema(url, ["name", "camelCase"], content=content)
         self.assertEqual(s.name, "a title")
         self.assertEqual(s.camel_case, "camelCase changed to camel_case.")
 
@@ -225,43 +202,49 @@ class TestSchema(unittest.TestCase):
         """
         Schema assigns None to properties not found in the web page.
         """
-        s = Schema(
-            "http://localhost:8000/schema/unavailable.html", ["name", "description"]
-        )
+        url, content = local("schema/unavailable.html")
+        s = Schema(url, ["name", "description"], content=content)
         self.assertEqual(s.name, None)
         self.assertEqual(s.description, None)
 
 
 class TestWebPreview(unittest.TestCase):
     """
-    Test web_preview.
+    Test web_preview, with both backends.
     """
 
+    def preview(self, path, **kwargs):
+        """
+        Run web_preview on a fixture page with every backend, check they agree
+        and return the result.
+        """
+        url, content = local(path)
+        previews = [
+            web_preview(url, content=content, backend=backend, **kwargs)
+            for backend in ("soup", "lxml")
+        ]
+        self.assertEqual(previews[0], previews[1])
+        return url, previews[0]
+
     def test_extracts_title_via_open_graph(self):
         """ """
-        title, description, image = web_preview(
-            "http://localhost:8000/open-graph/available.html"
-        )
+        url, (title, description, image) = self.preview("open-graph/available.html")
         self.assertEqual(title, "a title")
 
     def test_extracts_title_via_twitter_card(self):
         """ """
-        title, description, image = web_preview(
-            "http://localhost:8000/twitter-card/available.html"
-        )
+        url, (title, description, image) = self.preview("twitter-card/available.html")
         self.assertEqual(title, "a title")
 
     def test_extracts_title_via_schema(self):
         """ """
-        title, description, image = web_preview(
-            "http://localhost:8000/schema/available.html"
-        )
+        url, (title, description, image) = self.preview("schema/available.html")
         self.assertEqual(title, "a title")
 
     def test_extracts_description_via_generic_preview(self):
         """ """
-        title, description, image = web_preview(
-            "http://localhost:8000/generic-preview/h1-p-desc.html"
+        url, (title, description, image) = self.preview(
+            "generic-preview/h1-p-desc.html"
         )
         self.assertEqual(description, "This is valid description.")
 
@@ -269,8 +252,9 @@ class TestWebPreview(unittest.TestCase):
         """
         When a relative image path is found, the full absolute path is returned if the flag is True.
         """
-        url = "http://localhost:8000/open-graph/available-img-relative-path.html"
-        title, description, image = web_preview(url, absolute_image_url=True)
+        url, (title, description, image) = self.preview(
+            "open-graph/available-img-relative-path.html", absolute_image_url=True
+        )
         scheme, netloc, path, params, query, fragment = urlparse(url)
         base_url = "{}://{}".format(scheme, netloc)
         self.assertTrue(image.startswith(base_url))
@@ -279,8 +263,9 @@ class TestWebPreview(unittest.TestCase):
         """
         When a relative image path is found, the full absolute path is returned if the flag is True.
         """
-        url = "http://localhost:8000/twitter-card/available-img-relative-path.html"
-        title, description, image = web_preview(url, absolute_image_url=True)
+        url, (title, description, image) = self.preview(
+            "twitter-card/available-img-relative-path.html", absolute_image_url=True
+        )
         scheme, netloc, path, params, query, fragment = urlparse(url)
         base_url = "{}://{}".format(scheme, netloc)
         self.assertTrue(image.startswith(base_url))
@@ -289,8 +274,9 @@ class TestWebPreview(unittest.TestCase):
         """
         When a relative image path is found, the full absolute path is returned if the flag is True.
         """
-        url = "http://localhost:8000/schema/available-img-relative-path.html"
-        title, description, image = web_preview(url, absolute_image_url=True)
+        url, (title, description, image) = self.preview(
+            "schema/available-img-relative-path.html", absolute_image_url=True
+        )
         scheme, netloc, path, params, query, fragment = urlparse(url)
         base_url = "{}://{}".format(scheme, netloc)
         self.assertTrue(image.startswith(base_url))
@@ -299,12 +285,231 @@ class TestWebPreview(unittest.TestCase):
         """
         When a relative image path is found, the full absolute path is returned if the flag is True.
         """
-        url = "http://localhost:8000/generic-preview/h1-img-relative-path.html"
-        title, description, image = web_preview(url, absolute_image_url=True)
+        url, (title, description, image) = self.preview(
+            "generic-preview/h1-img-relative-path.html", absolute_image_url=True
+        )
         scheme, netloc, path, params, query, fragment = urlparse(url)
         base_url = "{}://{}".format(scheme, netloc)
         self.assertTrue(image.startswith(base_url))
 
 
+class TestAttributeName(unittest.TestCase):
+    """
+    Test attribute_name.
+    """
+
+    def test_attribute_names(self):
+        """
+        Meta properties are turned into attribute names.
+        """
+        self.assertEqual(attribute_name("og:title"), "title")
+        self.assertEqual(attribute_name("og:price:amount"), "price_amount")
+        self.assertEqual(attribute_name("camelCase"), "camel_case")
+        self.assertEqual(attribute_name("name"), "name")
+
+
+class TestParseOnce(unittest.TestCase):
+    """
+    Test the single parse web_preview and its lxml backend.
+    """
+
+    def test_lxml_backend_takes_bytes(self):
+        """
+        The lxml backend parses undecoded pages too.
+        """
+        content = fixture("corpus/schema.html").encode("utf-8")
+        preview = web_preview("https://example.com/", content=content, backend="lxml")
+        self.assertEqual(preview.title, "Schema title")
+
+    def test_lxml_backend_empty_page(self):
+        """
+        The lxml backend returns an empty Preview for an empty page.
+        """
+        preview = web_preview("https://example.com/", content="", backend="lxml")
+        self.assertEqual(preview, Preview(None, None, None))
+
+    def test_returns_preview(self):
+        """
+        web_preview returns a Preview, which unpacks like the old tuple.
+        """
+        preview = web_preview(
+            "https://example.com/",
+            content=fixture("corpus/opengraph.html"),
+            parser="lxml",
+        )
+        self.assertIsInstance(preview, Preview)
+        title, description, image = preview
+        self.assertEqual(preview.title, title)
+
+    def test_first_meta_tag_wins(self):
+        """
+        An empty og:title followed by a filled one is treated as missing.
+        """
+        content = (
+            '<meta property="og:title" content="">'
+            '<meta property="og:title" content="second">'
+            "<title>title</title>"
+        )
+        title, description, image = web_preview(
+            "https://example.com/", content=content, parser="lxml"
+        )
+        self.assertEqual(title, "title")
+
+    def test_generic_preview_reuses_soup(self):
+        """
+        GenericPreview extracts from an already parsed page.
+        """
+        soup = BeautifulSoup(fixture("corpus/generic.html"), "lxml")
+        apreview = GenericPreview("https://example.com/", soup=soup)
+        self.assertEqual(apreview.title, "Generic title")
+
+
+class TestCorpus(unittest.TestCase):
+    """
+    Regression suite: the previews of the real-world pages of the corpus
+    must not change, whatever the backend, and UrlTitle must turn them into
+    the same titles.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        with open(os.path.join(CORPUS, "expected.json"), encoding="utf-8") as f:
+            cls.expected = json.load(f)
+
+    def read(self, name):
+        with open(os.path.join(CORPUS, name), "rb") as f:
+            return f.read()
+
+    def test_corpus_is_complete(self):
+        """
+        Every page of the corpus has expected values.
+        """
+        pages = {name for name in os.listdir(CORPUS) if name.endswith(".html")}
+        self.assertEqual(pages, set(self.expected))
+
+    def test_web_preview(self):
+        """
+        web_preview extracts the expected title, description and image from
+        the undecoded pages.
+        """
+        for name, expected in self.expected.items():
+            for backend in ("soup", "lxml"):
+                with self.subTest(name, backend=backend):
+                    preview = web_preview(
+                        "https://example.com/",
+                        content=self.read(name),
+                        parser="lxml",
+                        backend=backend,
+                    )
+                    self.assertEqual(
+                        preview,
+                        Preview(
+                            expected["title"],
+                            expected["description"],
+                            expected["image"],
+                        ),
+                    )
+
+    def test_urltitle(self):
+        """
+        UrlTitle formats the expected titles, whether the pages are served
+        with the charset in their Content-Type or not.
+        """
+        from modules.urltitle import UrlTitle
+
+        urltitle = UrlTitle(None, max_bytes=1 << 20)
+        for name, expected in self.expected.items():
+            if expected["title"] is None:
+                continue
+            for content_type in (
+                "text/html; charset=" + expected["charset"],
+                "text/html",
+            ):
+                with self.subTest(name, content_type=content_type):
+                    response = requests.models.Response()
+                    response.status_code = 200
+                    response.url = "https://example.com/" + name
+                    response.headers["Content-Type"] = content_type
+                    response.raw = io.BytesIO(self.read(name))
+                    messages, _ = urltitle.fetch_title(response)
+                    self.assertEqual(
+                        messages,
+                        [
+                            "[ \x0303example.com\x03\x0f ] \x02"
+                            + " ".join(expected["title"].split())
+                        ],
+                    )
+
+
+class TestCharset(unittest.TestCase):
+    """
+    Test the charset sniffer.
+    """
+
+    def test_bom_wins(self):
+        """
+        The byte order mark wins over the header and the meta tags.
+        """
+        data = b"\xef\xbb\xbf<meta charset=koi8-r>"
+        self.assertEqual(sniff(data, "text/html; charset=cp1251"), ("utf-8-sig", "bom"))
+
+    def test_header_wins_over_meta(self):
+        """
+        An explicit charset in the Content-Type wins over the meta tags.
+        """
+        data = b"<meta charset=koi8-r>"
+        self.assertEqual(sniff(data, "text/html; charset=UTF-8"), ("utf-8", "header"))
+        self.assertEqual(sniff(data, "text/html"), ("koi8-r", "meta"))
+
+    def test_prescan(self):
+        """
+        The prescan finds meta charsets like the HTML specification does.
+        """
+        for data, encoding in (
+            (b'<meta charset="windows-1251">', "cp1251"),
+            (
+                b"<meta http-equiv='Content-Type' content='text/html; charset=shift_jis'>",
+                "shift_jis",
+            ),
+            (
+                b'<meta content="text/html; charset=koi8-r" http-equiv=content-type>',
+                "koi8-r",
+            ),
+            (b"<!-- <meta charset=big5> --><meta charset=euc-jp>", "euc_jp"),
+            (b'<div title="<meta charset=big5>"><meta charset=euc-jp>', "euc_jp"),
+            (b"<meta charset=bogus><meta charset=iso-8859-1>", "cp1252"),
+            (b"<meta charset=utf-16>", "utf-8"),
+            (b'<meta name=x content="charset=koi8-r">', None),
+            (b"<title>no charset</title>", None),
+        ):
+            with self.subTest(data):
+                self.assertEqual(charset.prescan(data), encoding)
+
+    def test_prescan_is_bounded(self):
+        """
+        Meta tags after the prescan limit are not looked at.
+        """
+        data = b"<!-- " + b"x" * 5000 + b" --><meta charset=koi8-r>"
+        self.assertEqual(charset.prescan(data), None)
+
+    def test_fallbacks(self):
+        """
+        Without declarations, UTF-8 is used if the bytes decode, windows-1252
+        otherwise.
+        """
+        self.assertEqual(sniff("<p>caf\u00e9".encode("utf-8")), ("utf-8", "utf-8"))
+        self.assertEqual(sniff("<p>caf\u00e9".encode("latin-1")), ("cp1252", "default"))
+
+    def test_head_reader_decodes(self):
+        """
+        HeadReader decodes with the sniffed encoding, across chunks.
+        """
+        with open(os.path.join(CORPUS, "shift-jis.html"), "rb") as f:
+            data = f.read()
+        reader = read_head(data[i : i + 7] for i in range(0, len(data), 7))
+        self.assertEqual(reader.encoding, "shift_jis")
+        self.assertIn("東京の天気予報", reader.text)
+
+
 if __name__ == "__main__":
     unittest.main()
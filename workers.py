@@ -0,0 +1,144 @@
+"""
+Worker pool running the (synchronous) modules for the IRC client.
+"""
+
+import asyncio
+import concurrent.futures
+
+DROP = "drop"
+BLOCK = "block"
+
+
+class WorkerPool:
+    """
+    WorkerPool runs jobs on a fixed amount of threads. Jobs sharing a key
+    (the channel or nick a message came from) run one at a time in the
+    order they were submitted, jobs with different keys run in parallel.
+
+    Every key has a bounded queue and the amount of jobs waiting overall is
+    bounded too. When a queue is full the job is either dropped or the
+    caller waits for room, depending on the policy.
+
+    A job still running after the timeout is abandoned: the next job of its
+    key is started, but its thread is only given back to the pool once the
+    job really returns.
+    """
+
+    def __init__(self, workers, queue_size, max_pending, policy=DROP, timeout=None):
+        """
+        __init__ is the constructor for the WorkerPool class, it must be
+        called from the event loop.
+
+        Args:
+            workers (int): the amount of threads.
+            queue_size (int): the amount of jobs that can wait per key.
+            max_pending (int): the amount of jobs that can wait overall.
+            policy (str): DROP or BLOCK, what to do when there is no room.
+            timeout (float): seconds after which a job is abandoned, None to
+            always wait for it.
+
+        Raises:
+            ValueError if the policy is unknown.
+        """
+        if policy not in (DROP, BLOCK):
+            raise ValueError(f"Unknown overload policy: {policy}")
+        self.loop = asyncio.get_running_loop()
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="botty-module"
+        )
+        # Never hand the executor more work than it has threads, so a busy
+        # key can not fill its internal queue ahead of the other keys.
+        self.slots = asyncio.Semaphore(workers)
+        self.pending = asyncio.Semaphore(max_pending)
+        self.queue_size = queue_size
+        self.policy = policy
+        self.timeout = timeout
+        self.queues = {}
+        self.drainers = set()
+        self.dropped = 0
+        self.abandoned = 0
+
+    async def submit(self, key, function, *args):
+        """
+        submit queues a job.
+
+        Args:
+            key (str): jobs with the same key run in order.
+            function (function): the job, it is run on a worker thread.
+            args: the arguments for the job.
+
+        Returns:
+            bool: False if the job was dropped.
+        """
+        if self.policy == BLOCK:
+            await self.pending.acquire()
+        else:
+            queue = self.queues.get(key)
+            if self.pending.locked() or (queue is not None and queue.full()):
+                self.dropped += 1
+                print(
+                    f"Overloaded, dropped a message for {key} ({self.dropped} dropped)"
+                )
+                return False
+            await self.pending.acquire()
+
+        # Looked up once the permit is held, the drainer of the key may have
+        # finished while waiting for it.
+        queue = self.queues.get(key)
+        if queue is None:
+            queue = self.queues[key] = asyncio.Queue(self.queue_size)
+            queue.put_nowait((function, args))
+            drainer = asyncio.create_task(self.drain(key, queue))
+            self.drainers.add(drainer)
+            drainer.add_done_callback(self.drainers.discard)
+            return True
+        # A full queue is not empty, so its drainer keeps it until the job
+        # is in.
+        await queue.put((function, args))
+        return True
+
+    async def drain(self, key, queue):
+        """
+        drain runs the jobs of a key one after another until its queue is
+        empty.
+        """
+        while True:
+            try:
+                function, args = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                # Nothing can be queued between the check and this, both
+                # run on the event loop.
+                del self.queues[key]
+                return
+            try:
+                await self.slots.acquire()
+                future = self.loop.run_in_executor(self.executor, function, *args)
+                future.add_done_callback(self.release)
+                await asyncio.wait_for(asyncio.shield(future), self.timeout)
+            except asyncio.TimeoutError:
+                self.abandoned += 1
+                print(
+                    f"Gave up waiting on a message for {key} after {self.timeout}s ({self.abandoned} abandoned)"
+                )
+            except Exception as e:
+                print(f"Error: {e}")
+            finally:
+                self.pending.release()
+
+    def release(self, future):
+        """
+        release gives the thread of a finished job back to the pool.
+        """
+        self.slots.release()
+        if not future.cancelled():
+            # Retrieve the exception of abandoned jobs so it is not reported
+            # as never retrieved, drain already reported the others.
+            future.exception()
+
+    def shutdown(self):
+        """
+        shutdown stops the worker threads once their current job is done.
+        """
+        for drainer in self.drainers:
+            drainer.cancel()
+        self.executor.shutdown(wait=False)